@@ -1,4 +1,30 @@
 # -*- mode: python ; coding: utf-8 -*-
+from pathlib import Path
+
+MODEL_ASSETS = Path(SPECPATH) / 'python' / 'model_assets'
+
+
+def model_asset_datas():
+    """
+    Inference assets to bundle: the tell lists, plus each tier's quantized bundle when
+    export_quantized_model.py has written one, or its full vectorizer and model otherwise.
+    """
+    datas = [(str(MODEL_ASSETS / 'tell_lists'), 'model_assets/tell_lists')]
+    tiers = sorted({
+        path.name.removeprefix('ld_').removesuffix(suffix)
+        for folder, suffix in (('vectorizers', '_vectorizer.joblib'), ('models', '_ensemble_model.joblib'))
+        for path in (MODEL_ASSETS / folder).glob(f'ld_*{suffix}')
+    })
+    for tier in tiers:
+        quantized = MODEL_ASSETS / 'quantized' / f'ld_{tier}_quantized.joblib'
+        if quantized.exists():
+            datas.append((str(quantized), 'model_assets/quantized'))
+            continue
+        for folder, file in (('vectorizers', f'ld_{tier}_vectorizer.joblib'), ('models', f'ld_{tier}_ensemble_model.joblib')):
+            if (MODEL_ASSETS / folder / file).exists():
+                datas.append((str(MODEL_ASSETS / folder / file), f'model_assets/{folder}'))
+    return datas
+
 
 
 a = Analysis(
@@ -6,7 +32,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[
-        ('python/model_assets', 'model_assets'),
+        *model_asset_datas(),
         ('python/utils', 'utils'),
         ('python/definitions', 'definitions'),
     ],
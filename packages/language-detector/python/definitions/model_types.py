@@ -0,0 +1,11 @@
+# Tiers of the detection cascade, in training order; each has its own vectorizer and model
+MODEL_TYPES = [
+    "family",
+    "perso_arabic",
+    "cyrillic",
+    "indic",
+    "ja_zh",
+    "eastern_slavic",
+    "southern_slavic",
+    "turkic",
+]
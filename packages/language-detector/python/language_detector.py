@@ -8,8 +8,10 @@ Source: https://wortschatz.uni-leipzig.de/en/download
 License: https://creativecommons.org/licenses/by/4.0/
 """
 
+import gc
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 import joblib
@@ -22,12 +24,17 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 os.environ['DISABLE_LOGGING'] = '1'
 
 from definitions.language_codes import Code_Language
+from definitions.model_types import MODEL_TYPES
 from utils.build_extended_features_block import build_extended_features_block
+from utils.memory_usage import current_rss_bytes, deep_size
+from utils.ngram_features import SharedNGrams
+from utils.quantized_model import QuantizedEnsemble, load_quantized_tools, quantized_model_path
 
 # Constants
 HERE = Path(__file__).resolve().parent
 MODEL_ASSETS = HERE / "model_assets"
 KANA_OR_JAPANESE_MARKS = regex.compile(r"[\u3040-\u30ff\u31f0-\u31ff\uff66-\uff9f]")
+MEMORY_REPORT_COLUMNS = ["vocabulary", "idf", "stop_words", "vectorizer", "nb", "logreg", "model", "total", "rss_delta"]
 
 
 def detect_language(string: str) -> Code_Language:
@@ -52,34 +59,28 @@ def detect_language(string: str) -> Code_Language:
         return "ja"
 
 
-    # First, determine the language family
-    family = evaluate_input(string, "family")
-
-    # Route to specific family models
-    if family in ["el", "ko"]:
-        return family
-    elif family == "indic":
-        return evaluate_input(string, "indic")
-    elif family == "ja_zh":
-        return evaluate_input(string, "ja_zh")
-    elif family == "perso-arabic":
-        return evaluate_input(string, "perso_arabic")
-    elif family == "cyrillic":
-        cyrillic_family = evaluate_input(string, "cyrillic")
-
-        if cyrillic_family == "southern_cyrillic":
-            return evaluate_input(string, "southern_cyrillic")
-        elif cyrillic_family == "eastern_cyrillic":
-            return evaluate_input(string, "eastern_cyrillic")
-        else:
-            return evaluate_input(string, "turkic")
-    else:
-        return family
+    # Every tier reuses the n-grams extracted from the input by the tiers before it
+    ngrams = SharedNGrams(string)
+
+    # First, determine the language family, then follow labels that name a later tier
+    # (e.g. "perso-arabic", or "turkic" from the cyrillic tier) until one is a language code
+    model_type = "family"
+    label = evaluate_input(string, model_type, ngrams)
+    while (routed := label.replace("-", "_")) in MODEL_TYPES[MODEL_TYPES.index(model_type) + 1:]:
+        model_type = routed
+        label = evaluate_input(string, model_type, ngrams)
+    return label
 
 
-def load_tools(model_type: str) -> tuple[TfidfVectorizer, VotingClassifier]:
+@lru_cache(maxsize=None)
+def load_tools(model_type: str) -> tuple[TfidfVectorizer, VotingClassifier | QuantizedEnsemble]:
     """
     Load the vectorizer and model for a given model type.
+
+    A quantized bundle written by export_quantized_model.py is preferred when present,
+    unless the vectorizer and model files it was exported from have changed since.
+    Frozen builds ship the bundle instead of those files, so there is nothing to check.
+    Each tier is loaded on first use and kept for the life of the process.
     
     Args:
         model_type: The type of model to load the tools for
@@ -94,7 +95,14 @@ def load_tools(model_type: str) -> tuple[TfidfVectorizer, VotingClassifier]:
     try:
         vectorizer_file = MODEL_ASSETS / "vectorizers" / f"ld_{model_type}_vectorizer.joblib"
         model_file = MODEL_ASSETS / "models" / f"ld_{model_type}_ensemble_model.joblib"
-        
+
+        quantized_file = quantized_model_path(MODEL_ASSETS, model_type)
+        if quantized_file.exists():
+            source_files = () if getattr(sys, "frozen", False) else (vectorizer_file, model_file)
+            tools = load_quantized_tools(quantized_file, source_files)
+            if tools is not None:
+                return tools
+
         if not vectorizer_file.exists():
             raise FileNotFoundError(f"Vectorizer file not found: {vectorizer_file}")
         if not model_file.exists():
@@ -111,13 +119,14 @@ def load_tools(model_type: str) -> tuple[TfidfVectorizer, VotingClassifier]:
         raise Exception(f"Failed to load tools for {model_type}: {e}")
 
 
-def evaluate_input(string: str, model_type: str) -> str:
+def evaluate_input(string: str, model_type: str, ngrams: SharedNGrams | None = None) -> str:
     """
     Evaluate the input string for a given model type.
     
     Args:
         string: The string to evaluate
         model_type: The type of model to evaluate the input for
+        ngrams: N-gram counts shared with other tiers evaluating the same string
         
     Returns:
         The predicted language of the input string
@@ -129,7 +138,9 @@ def evaluate_input(string: str, model_type: str) -> str:
         vectorizer, model = load_tools(model_type)
 
         # Transform input text
-        X_base = vectorizer.transform([string])
+        if ngrams is None:
+            ngrams = SharedNGrams(string)
+        X_base = ngrams.transform(vectorizer)
         X_ext = build_extended_features_block([string], model_type)
 
         # Ensure consistent data types
@@ -148,10 +159,108 @@ def evaluate_input(string: str, model_type: str) -> str:
         raise Exception(f"Evaluation failed for {model_type}: {e}")
 
 
+def tier_components(vectorizer: TfidfVectorizer, model: VotingClassifier | QuantizedEnsemble) -> dict[str, object]:
+    """
+    The parts of a loaded tier that account for most of its memory.
+
+    Args:
+        vectorizer: The tier's vectorizer
+        model: The tier's ensemble or quantized ensemble
+
+    Returns:
+        Mapping of component name to the objects that make it up
+    """
+    if isinstance(model, QuantizedEnsemble):
+        nb = (model.nb_weights_, model.nb_scales_)
+        logreg = (model.lr_weights_, model.lr_scales_, model.lr_intercept_)
+    else:
+        nb, logreg = model.named_estimators_["nb"], model.named_estimators_["logreg"]
+
+    return {
+        "vocabulary": getattr(vectorizer, "vocabulary_", None),
+        "idf": vectorizer._tfidf,
+        # Terms pruned by min_df/max_df, kept by sklearn but never used at inference
+        "stop_words": getattr(vectorizer, "stop_words_", None),
+        "nb": nb,
+        "logreg": logreg,
+    }
+
+
+def memory_report(model_types: list[str] = MODEL_TYPES) -> list[dict]:
+    """
+    Load each tier through load_tools and measure the memory it keeps resident.
+
+    Tiers are loaded in order and stay loaded, as they would in a long-lived process,
+    so each RSS delta is the growth caused by that tier alone. A tier loaded before
+    the report started shows a delta of zero.
+
+    Args:
+        model_types: Tiers to load
+
+    Returns:
+        One dict per tier with its model type, whether it was found, and the deep size
+        in bytes of each component, the vectorizer, the model and both together, plus
+        the RSS delta in bytes (None where RSS cannot be read)
+    """
+    report = []
+    for model_type in model_types:
+        gc.collect()
+        rss_before = current_rss_bytes()
+        try:
+            vectorizer, model = load_tools(model_type)
+        except FileNotFoundError:
+            report.append({"model_type": model_type, "loaded": False})
+            continue
+        gc.collect()
+        rss_after = current_rss_bytes()
+
+        row = {"model_type": model_type, "loaded": True}
+        row.update({name: deep_size(part) for name, part in tier_components(vectorizer, model).items()})
+        row["vectorizer"] = deep_size(vectorizer)
+        row["model"] = deep_size(model)
+        row["total"] = deep_size((vectorizer, model))
+        row["rss_delta"] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        report.append(row)
+
+    return report
+
+
+def format_memory_report(report: list[dict]) -> str:
+    """
+    Render memory_report output as a table in MiB.
+
+    Args:
+        report: Rows returned by memory_report
+
+    Returns:
+        The table, with a totals row for the loaded tiers
+    """
+    def mib(value: int | None) -> str:
+        return "n/a" if value is None else f"{value / 2**20:.1f}"
+
+    loaded = [row for row in report if row["loaded"]]
+    totals = {column: sum(row[column] or 0 for row in loaded) for column in MEMORY_REPORT_COLUMNS}
+
+    width = max([len(row["model_type"]) for row in report] + [len("total")])
+    lines = [f"{'tier':<{width}} " + " ".join(f"{column:>11}" for column in MEMORY_REPORT_COLUMNS)]
+    for row in report:
+        if row["loaded"]:
+            lines.append(f"{row['model_type']:<{width}} " + " ".join(f"{mib(row[c]):>11}" for c in MEMORY_REPORT_COLUMNS))
+        else:
+            lines.append(f"{row['model_type']:<{width}} (model files not found)")
+    lines.append(f"{'total':<{width}} " + " ".join(f"{mib(totals[c]):>11}" for c in MEMORY_REPORT_COLUMNS))
+    lines.append(f"Sizes in MiB; process RSS {mib(current_rss_bytes())} MiB")
+    return "\n".join(lines)
+
+
 def main() -> None:
     """Main entry point for command line usage."""
+    if sys.argv[1:] == ["--memory-report"]:
+        print(format_memory_report(memory_report()))
+        return
+
     if len(sys.argv) != 2:
-        raise ValueError("Usage: python language_detector.py <input>")
+        raise ValueError("Usage: python language_detector.py <input> | --memory-report")
 
     string = sys.argv[1]
     
@@ -1,6 +1,10 @@
 import subprocess, sys, os
 from pathlib import Path
 
+# Run as a script, so the python root holding the shared definitions is not on the path yet
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from definitions.model_types import MODEL_TYPES
+
 
 def create_data_dirs(base_dir: Path):
     # define all desired directories relative to base_dir
@@ -32,17 +36,8 @@ def create_data_dirs(base_dir: Path):
     return model_assets
 
 
-def train_model(model_dir: Path):
-    model_type = [
-        "family",
-        "perso_arabic",
-        "cyrillic",
-        "indic",
-        "ja_zh",
-        "eastern_slavic",
-        "southern_slavic",
-        "turkic",
-    ]
+def train_model(model_dir: Path, prune: bool = False):
+    model_type = MODEL_TYPES
 
     python_root = Path(__file__).resolve().parent.parent  # .../python
     env = os.environ.copy()
@@ -54,6 +49,8 @@ def train_model(model_dir: Path):
         "vectorize_training_data.py",
         "split_data.py",
         "train_model.py",
+        # Pruning is opt-in: it needs validation rows held out of training
+        *(["prune_model.py"] if prune else []),
         "run_test_data.py",
     ]:
         if script == "create_datasets.py":
@@ -78,11 +75,13 @@ def train_model(model_dir: Path):
                             if script
                             in [
                                 "train_model.py",
+                                "prune_model.py",
                                 "vectorize_training_data.py",
                                 "run_test_data.py",
                             ]
                             else []
                         ),
+                        *(["--validation"] if prune and script == "split_data.py" else []),
                     ],
                     check=True,
                     cwd=str(python_root),
@@ -93,5 +92,7 @@ def train_model(model_dir: Path):
 if __name__ == "__main__":
     # parent folder of this script
     script_parent = Path(__file__).resolve().parent
+    if not set(sys.argv[1:]) <= {"--prune"}:
+        sys.exit("Usage: python model_training.py [--prune]")
     model_dir = create_data_dirs(script_parent)
-    train_model(model_dir)
+    train_model(model_dir, prune="--prune" in sys.argv[1:])
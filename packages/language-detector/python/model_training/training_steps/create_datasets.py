@@ -7,6 +7,8 @@ License: https://creativecommons.org/licenses/by/4.0/
 """
 
 import logging
+import sys
+import time
 from typing import Dict, List
 import csv
 from pathlib import Path
@@ -15,6 +17,13 @@ import numpy as np
 import pandas as pd
 import regex
 
+from definitions.model_types import MODEL_TYPES
+from utils.text_util import (
+    build_codepoint_table,
+    encode_codepoints,
+    reduce_codepoint_segments,
+)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -24,10 +33,11 @@ logger = logging.getLogger(__name__)
 # Configuration constants
 LANGUAGE_CODE_LENGTH = 3
 TEXT_COLUMN = 1
-EXCLUDE_PATTERN = regex.compile(r"^[\p{Latin}\p{Nd}\p{P}\p{S}\p{Z}]+$")
-KANA_OR_JAPANESE_MARKS = regex.compile(
-    r"[\p{Script=Hiragana}\p{Script=Katakana}\u30FC\uFF70\u30FB\u3005]"
-)
+NON_SCRIPT_CHARACTERS = r"[\p{Latin}\p{Nd}\p{P}\p{S}\p{Z}]"
+JAPANESE_MARK_CHARACTERS = r"[\p{Script=Hiragana}\p{Script=Katakana}\u30FC\uFF70\u30FB\u3005]"
+EXCLUDE_PATTERN = regex.compile(rf"^{NON_SCRIPT_CHARACTERS}+$")
+KANA_OR_JAPANESE_MARKS = regex.compile(JAPANESE_MARK_CHARACTERS)
+FILTER_CHUNK_SIZE = 200_000
 
 CODE_LANGUAGE_MAP = {
     "ara": "ar",
@@ -106,16 +116,7 @@ LANGUAGE_CLASSIFICATIONS = {
     "ja_zh": ["ja", "zh"],
 }
 
-DATASET_NAMES = [
-    "family",
-    "perso_arabic",
-    "cyrillic",
-    "indic",
-    "ja_zh",
-    "eastern_slavic",
-    "southern_slavic",
-    "turkic",
-]
+DATASET_NAMES = MODEL_TYPES
 
 
 def initialize_datasets() -> Dict[str, List]:
@@ -162,17 +163,20 @@ def filter_non_script_text(df: pd.DataFrame) -> np.ndarray:
     """
     Filter out text that does not contain untransliterated script.
 
+    Equivalent to dropping every row matched by EXCLUDE_PATTERN, but evaluated with
+    a codepoint lookup table over packed buffers instead of one regex call per row.
+
     Args:
         df: DataFrame containing the training data
 
     Returns:
         np.ndarray containing the filtered text
     """
-    return np.array(
-        df["text"][
-            ~df["text"].astype(str).apply(lambda s: bool(EXCLUDE_PATTERN.match(s)))
-        ]
+    missing = df["text"].isna().to_numpy()
+    exclude = missing | chunked_codepoint_mask(
+        df["text"].fillna("").astype(str).to_numpy(), NON_SCRIPT_CHARACTERS, all_in_class=True
     )
+    return np.array(df["text"][~exclude])
 
 
 def filter_japanese_marks(text: np.ndarray) -> np.ndarray:
@@ -185,7 +189,78 @@ def filter_japanese_marks(text: np.ndarray) -> np.ndarray:
      Returns:
          np.ndarray containing the filtered text
     """
-    return np.array([s for s in text if not KANA_OR_JAPANESE_MARKS.search(str(s))])
+    has_marks = chunked_codepoint_mask(
+        [str(s) for s in text], JAPANESE_MARK_CHARACTERS, all_in_class=False
+    )
+    return np.array(text[~has_marks])
+
+
+def chunked_codepoint_mask(texts, char_class: str, all_in_class: bool) -> np.ndarray:
+    """
+    Evaluate a character class over many strings in fixed-size chunks.
+
+    Args:
+        texts: Sequence of strings to evaluate
+        char_class: Regex character class to look up
+        all_in_class: If True, flag non-empty strings made up entirely of the class
+            (ignoring one trailing newline, as `$` does); otherwise flag strings
+            containing at least one character of the class
+
+    Returns:
+        Boolean np.ndarray with one flag per string
+    """
+    table = build_codepoint_table(char_class)
+    mask = np.zeros(len(texts), dtype=bool)
+
+    for start in range(0, len(texts), FILTER_CHUNK_SIZE):
+        stop = start + FILTER_CHUNK_SIZE
+        codepoints, offsets = encode_codepoints(texts[start:stop])
+        in_class = table[codepoints]
+
+        if all_in_class:
+            # Let a trailing newline pass, but not when it is the only character
+            lengths = np.diff(offsets)
+            ends = offsets[1:][lengths > 1] - 1
+            in_class[ends[codepoints[ends] == ord("\n")]] = True
+
+        mask[start:stop] = reduce_codepoint_segments(in_class, offsets, all_in_class)
+
+    return mask
+
+
+def benchmark_filters(file_path: Path) -> None:
+    """
+    Time the vectorized filters against per-row regex matching on one raw corpus file.
+
+    Args:
+        file_path: Path to a raw training data file
+
+    Raises:
+        AssertionError: If the two approaches disagree on any row
+    """
+    df = load_training_data(file_path)
+    text = df["text"].fillna("nan").astype(str)
+    logger.info(f"Benchmarking script filters on {len(df):,} rows from {file_path.name}")
+
+    start = time.perf_counter()
+    regex_script = text[~text.apply(lambda s: bool(EXCLUDE_PATTERN.match(s)))].to_numpy()
+    regex_kept = np.array([s for s in regex_script if not KANA_OR_JAPANESE_MARKS.search(s)])
+    regex_seconds = time.perf_counter() - start
+
+    # Table construction is a one-off cost per process, so keep it out of the timing
+    build_codepoint_table(NON_SCRIPT_CHARACTERS)
+    build_codepoint_table(JAPANESE_MARK_CHARACTERS)
+
+    start = time.perf_counter()
+    vectorized_script = filter_non_script_text(df)
+    vectorized_kept = filter_japanese_marks(vectorized_script)
+    vectorized_seconds = time.perf_counter() - start
+
+    assert np.array_equal(regex_script, vectorized_script.astype(str))
+    assert np.array_equal(regex_kept, np.asarray(vectorized_kept, dtype=str))
+
+    logger.info(f"Regex filters: {regex_seconds:.2f}s")
+    logger.info(f"Vectorized filters: {vectorized_seconds:.2f}s ({regex_seconds / vectorized_seconds:.1f}x faster)")
 
 
 def classify_language(language_code: str) -> list[str]:
@@ -263,6 +338,10 @@ def write_datasets(datasets: Dict[str, List], base: Path) -> None:
 
 def main():
 
+    if len(sys.argv) == 3 and sys.argv[1] == "--benchmark":
+        benchmark_filters(Path(sys.argv[2]))
+        return
+
     base = Path(__file__).resolve().parents[1]
     training_folder = base / Path("data/raw")
 
@@ -0,0 +1,139 @@
+"""
+This model was trained using corpora provided by the Wortschatz Project
+(University of Leipzig), licensed under CC BY 4.0.
+
+Source: https://wortschatz.uni-leipzig.de/en/download
+License: https://creativecommons.org/licenses/by/4.0/
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix, diags, hstack
+from sklearn.preprocessing import normalize
+
+from run_test_data import load_test_data
+from utils.quantized_model import (
+    QUANTIZATION_MODES,
+    QuantizedEnsemble,
+    load_quantized_tools,
+    quantized_model_path,
+    save_quantized_tools,
+    source_stamp,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODE = "int8"
+# Fraction of test predictions the quantized model must share with the full-precision model
+MIN_AGREEMENT = 0.995
+
+
+def requantize_features(X: csr_matrix, idf: np.ndarray, quantized_idf: np.ndarray) -> csr_matrix:
+    """
+    Reproduce what the vectorizer would output with its IDF weights quantized.
+
+    Each TF-IDF column is rescaled by the ratio of the quantized to the original
+    weight and the rows are L2-renormalized, as TfidfVectorizer.transform would.
+    The extended block after the TF-IDF columns is passed through unchanged.
+
+    Args:
+        X: Features built with the full-precision vectorizer
+        idf: Original IDF weights
+        quantized_idf: IDF weights as stored in the quantized bundle
+
+    Returns:
+        Features matching the quantized vectorizer
+    """
+    n_vocabulary = len(idf)
+    X = csr_matrix(X)
+    ratio = (quantized_idf.astype(np.float64) / idf).astype(X.dtype)
+    tfidf = normalize(X[:, :n_vocabulary] @ diags(ratio))
+    return hstack([tfidf, X[:, n_vocabulary:]], format="csr").astype(X.dtype, copy=False)
+
+
+def export_quantized_model(model_type: str, model_dir: str, mode: str = DEFAULT_MODE,
+                           min_agreement: float = MIN_AGREEMENT) -> None:
+    """
+    Quantize a tier's vectorizer and model and export them if they agree with the original.
+
+    Args:
+        model_type: Type of model to export
+        model_dir: Path to model assets directory
+        mode: One of QUANTIZATION_MODES
+        min_agreement: Minimum share of test predictions that must match the full-precision model
+
+    Raises:
+        ValueError: If mode is unknown or the quantized model disagrees too often
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+
+    model_assets = Path(model_dir)
+    base = Path(__file__).resolve().parents[1]
+    vectorizer_file = model_assets / "vectorizers" / f"ld_{model_type}_vectorizer.joblib"
+    model_file = model_assets / "models" / f"ld_{model_type}_ensemble_model.joblib"
+    output_file = quantized_model_path(model_assets, model_type)
+
+    vectorizer = joblib.load(vectorizer_file)
+    model = joblib.load(model_file)
+    X_test, y_test = load_test_data(model_type, base)
+
+    logger.info(f"Quantizing {model_type} model to {mode}")
+    quantized = QuantizedEnsemble(model, mode)
+
+    # Write to a temporary file first, then verify exactly what was written
+    staging_file = output_file.with_suffix(".tmp")
+    save_quantized_tools(staging_file, vectorizer, quantized, source_stamp((vectorizer_file, model_file)))
+    quantized_vectorizer, quantized = load_quantized_tools(staging_file)
+
+    X_quantized = requantize_features(X_test, vectorizer.idf_, quantized_vectorizer.idf_)
+    y_full = model.predict(X_test)
+    y_quantized = quantized.predict(X_quantized)
+
+    agreement = float((y_full == y_quantized).mean())
+    accuracy_full = float((y_full == y_test).mean())
+    accuracy_quantized = float((y_quantized == y_test).mean())
+    logger.info(f"Prediction agreement with full precision: {agreement:.4f}")
+    logger.info(f"Test accuracy: {accuracy_full:.4f} (full) -> {accuracy_quantized:.4f} ({mode})")
+
+    if agreement < min_agreement:
+        staging_file.unlink()
+        raise ValueError(f"Agreement {agreement:.4f} is below the required {min_agreement}; not exporting")
+
+    staging_file.replace(output_file)
+
+    size_full = vectorizer_file.stat().st_size + model_file.stat().st_size
+    size_quantized = output_file.stat().st_size
+    logger.info(
+        f"Exported {output_file}: {size_full / 2**20:.2f} MiB -> {size_quantized / 2**20:.2f} MiB "
+        f"({size_full / size_quantized:.1f}x smaller)"
+    )
+
+
+def main() -> None:
+    """Main entry point for command line usage."""
+    if len(sys.argv) not in (3, 4, 5):
+        logger.error("Usage: python export_quantized_model.py <model_type> <model_dir> [float16|int8] [min_agreement]")
+        sys.exit(1)
+
+    model_type = sys.argv[1]
+    model_dir = sys.argv[2]
+    mode = sys.argv[3] if len(sys.argv) >= 4 else DEFAULT_MODE
+    min_agreement = float(sys.argv[4]) if len(sys.argv) == 5 else MIN_AGREEMENT
+
+    try:
+        export_quantized_model(model_type, model_dir, mode, min_agreement)
+        logger.info(f"Quantized export completed successfully for {model_type}")
+    except Exception as e:
+        logger.error(f"Quantized export failed for {model_type}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
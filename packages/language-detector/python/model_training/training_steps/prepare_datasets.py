@@ -2,8 +2,8 @@ import logging
 import sys
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from sklearn.utils import resample
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,92 +21,159 @@ THRESHOLDS = {
 }
 
 RANDOM_SEED = 42
+CHUNK_SIZE = 1_000_000
 INPUT_DATA_DIR = "data/intermediate"
 OUTPUT_DATA_DIR = "data/intermediate"
 
 
-def load_dataset(base: Path, model_type: str) -> pd.DataFrame:
+class LabelReservoir:
     """
-    Load dataset for a specific model type.
-    
+    Uniform sample without replacement of the row indices of one class, kept in a single streaming pass.
+
+    Every row gets a random priority and the reservoir holds the `capacity` rows with the
+    lowest priorities seen so far, which is a uniform sample of everything offered.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.seen = 0
+        self.rows = np.empty(0, dtype=np.int64)
+        self.priorities = np.empty(0, dtype=np.float64)
+
+    def offer(self, rows: np.ndarray, priorities: np.ndarray) -> None:
+        """
+        Offer a batch of row indices to the reservoir.
+
+        Args:
+            rows: Row indices belonging to this class
+            priorities: Random priorities drawn for those rows
+        """
+        self.seen += len(rows)
+
+        if len(self.rows) == self.capacity:
+            # Once full, only rows that beat the current worst priority can get in
+            candidates = priorities < self.priorities.max()
+            rows, priorities = rows[candidates], priorities[candidates]
+
+        self.rows = np.concatenate([self.rows, rows])
+        self.priorities = np.concatenate([self.priorities, priorities])
+
+        if len(self.rows) > self.capacity:
+            keep = np.argpartition(self.priorities, self.capacity - 1)[: self.capacity]
+            self.rows = self.rows[keep]
+            self.priorities = self.priorities[keep]
+
+
+def sample_dataset_indices(base: Path, model_type: str, rng: np.random.Generator) -> dict[str, LabelReservoir]:
+    """
+    Stream the label column of a dataset and reservoir-sample row indices per class.
+
     Args:
         base: Base directory for the dataset
-        model_type: Type of model to load data for (e.g., 'family', 'cyrillic')
-        
+        model_type: Type of model to sample data for (e.g., 'family', 'cyrillic')
+        rng: Random generator used for reservoir priorities
+
     Returns:
-        DataFrame containing the dataset
-        
+        Dictionary mapping each label to its reservoir
+
     Raises:
         FileNotFoundError: If dataset file is not found
         pd.errors.EmptyDataError: If dataset file is empty
     """
+    _, MAX_SIZE = THRESHOLDS[model_type]
+    file_path = base / INPUT_DATA_DIR / f"ld_{model_type}_data.csv"
+
     try:
-        file_path = base / INPUT_DATA_DIR / f"ld_{model_type}_data.csv"
-        logger.info(f"Loading dataset from {file_path}")
-        df = pd.read_csv(file_path)
-        logger.info(f"Loaded {len(df)} rows for {model_type}")
-        return df
+        logger.info(f"Streaming labels from {file_path}")
+        reservoirs: dict[str, LabelReservoir] = {}
+        offset = 0
+
+        for chunk in pd.read_csv(file_path, usecols=["label"], chunksize=CHUNK_SIZE):
+            labels = chunk["label"].to_numpy()
+            rows = np.arange(offset, offset + len(labels), dtype=np.int64)
+            priorities = rng.random(len(labels))
+            offset += len(labels)
+
+            for label in np.unique(labels):
+                in_label = labels == label
+                reservoir = reservoirs.setdefault(label, LabelReservoir(MAX_SIZE))
+                reservoir.offer(rows[in_label], priorities[in_label])
+
+        logger.info(f"Streamed {offset:,} rows for {model_type}")
+        return reservoirs
     except FileNotFoundError:
-        logger.error(f"Dataset file not found: {base / INPUT_DATA_DIR / f'ld_{model_type}_data.csv'}")
+        logger.error(f"Dataset file not found: {file_path}")
         raise
     except pd.errors.EmptyDataError:
         logger.error(f"Dataset file is empty: ld_{model_type}_data.csv")
         raise
 
 
-def balance_dataset(df: pd.DataFrame, model_type: str) -> pd.DataFrame:
+def balance_dataset(reservoirs: dict[str, LabelReservoir], model_type: str, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
     """
-    Balance dataset for a specific model type.
-    
+    Balance dataset for a specific model type as row indices and repeat counts.
+
+    Classes above the maximum keep their reservoir sample, and classes below the
+    minimum are up-sampled with replacement by raising per-row repeat counts rather
+    than duplicating text.
+
     Args:
-        df: DataFrame containing the dataset
+        reservoirs: Per-class reservoirs from sample_dataset_indices
         model_type: Type of model to balance data for (e.g., 'family', 'cyrillic')
+        rng: Random generator used for up-sampling
 
     Returns:
-        DataFrame containing the balanced dataset
+        Tuple of sorted source row indices and the number of times each row is used
     """
-    MIN_SIZE, MAX_SIZE = THRESHOLDS[model_type] 
+    MIN_SIZE, MAX_SIZE = THRESHOLDS[model_type]
 
     logger.info(f"Balancing {model_type} dataset (target: {MIN_SIZE:,} - {MAX_SIZE:,} samples per class)")
 
-    grouped = df.groupby("label")
-    balanced_groups = []
-    
-    for label, group in grouped:
-        n = len(group)
+    balanced_rows = []
+    balanced_counts = []
+
+    for label, reservoir in sorted(reservoirs.items()):
+        n = reservoir.seen
         if n < MIN_SIZE:
             logger.info(f"Up-sampling {label} from {n:,} to {MIN_SIZE:,} samples")
-            resampled = resample(
-                group, replace=True, n_samples=MIN_SIZE, random_state=RANDOM_SEED
-            )
+            counts = np.bincount(rng.integers(0, n, MIN_SIZE), minlength=n)
         elif n > MAX_SIZE:
             logger.info(f"Down-sampling {label} from {n:,} to {MAX_SIZE:,} samples")
-            resampled = group.sample(n=MAX_SIZE, random_state=RANDOM_SEED)
+            counts = np.ones(MAX_SIZE, dtype=np.int64)
         else:
             logger.info(f"{label} is already balanced with {n:,} samples")
-            resampled = group
-        balanced_groups.append(resampled)
+            counts = np.ones(n, dtype=np.int64)
 
-    balanced_df = pd.concat(balanced_groups).sample(frac=1, random_state=RANDOM_SEED)
-    
-    logger.info(f"Balanced dataset created with {len(balanced_df):,} total samples")
-    return balanced_df
+        used = counts > 0
+        balanced_rows.append(reservoir.rows[used])
+        balanced_counts.append(counts[used])
 
+    rows = np.concatenate(balanced_rows)
+    counts = np.concatenate(balanced_counts).astype(np.uint32)
+    order = np.argsort(rows)
 
-def write_dataset(df: pd.DataFrame, base: Path, model_type: str) -> None:
+    logger.info(f"Balanced dataset created with {int(counts.sum()):,} total samples from {len(rows):,} unique rows")
+    return rows[order], counts[order]
+
+
+def write_dataset(rows: np.ndarray, counts: np.ndarray, base: Path, model_type: str) -> None:
     """
-    Write dataset to CSV file.
-    
+    Write the balanced row index to disk.
+
+    The index refers to rows of ld_{model_type}_data.csv; the vectorization step
+    expands and shuffles it when loading the text.
+
     Args:
-        df: DataFrame containing the dataset
+        rows: Sorted source row indices
+        counts: Number of times each row is used
         base: Base directory for the output file
         model_type: Type of model to write data for (e.g., 'family', 'cyrillic')
     """
-    output_file = base / OUTPUT_DATA_DIR / f"ld_balanced_{model_type}_data.csv"
-    logger.info(f"Writing {model_type} balanced dataset to {output_file}")
-    
-    df.to_csv(output_file, index=False)
-    logger.info(f"Successfully wrote {len(df):,} rows to {output_file}")
+    output_file = base / OUTPUT_DATA_DIR / f"ld_balanced_{model_type}_index.npz"
+    logger.info(f"Writing {model_type} balanced index to {output_file}")
+
+    np.savez(output_file, rows=rows, counts=counts)
+    logger.info(f"Successfully wrote {len(rows):,} indexed rows to {output_file}")
 
 
 def validate_model_type(model_type: str) -> None:
@@ -119,7 +186,7 @@ def validate_model_type(model_type: str) -> None:
 
 def prepare_dataset(base: Path, model_type: str) -> None:
     """
-    Prepare a single dataset by loading, balancing, and writing it.
+    Prepare a single dataset by sampling, balancing, and writing its row index.
     
     Args:
         base: Base directory for the dataset
@@ -128,14 +195,16 @@ def prepare_dataset(base: Path, model_type: str) -> None:
     logger.info(f"Starting preparation of {model_type} dataset")
     
     try:
-        # Load dataset
-        df = load_dataset(base, model_type)
+        rng = np.random.default_rng(RANDOM_SEED)
+
+        # Sample row indices per class
+        reservoirs = sample_dataset_indices(base, model_type, rng)
         
         # Balance dataset
-        balanced_df = balance_dataset(df, model_type)
+        rows, counts = balance_dataset(reservoirs, model_type, rng)
         
-        # Write balanced dataset
-        write_dataset(balanced_df, base, model_type)
+        # Write balanced index
+        write_dataset(rows, counts, base, model_type)
         
         logger.info(f"Successfully prepared {model_type} dataset")
         
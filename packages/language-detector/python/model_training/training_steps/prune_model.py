@@ -0,0 +1,333 @@
+"""
+This model was trained using corpora provided by the Wortschatz Project
+(University of Leipzig), licensed under CC BY 4.0.
+
+Source: https://wortschatz.uni-leipzig.de/en/download
+License: https://creativecommons.org/licenses/by/4.0/
+"""
+
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+from sklearn.ensemble import VotingClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.multiclass import OneVsRestClassifier
+from sklearn.preprocessing import normalize
+
+from utils.sparse_storage import load_csr, load_split, save_columns
+from vectorize_training_data import feature_layout_fingerprint
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Columns whose importance is below this fraction of the most important column are dropped
+PRUNE_THRESHOLD = 0.01
+# Pruned artifacts are not written if validation accuracy drops by more than this
+MAX_ACCURACY_DROP = 0.002
+
+
+def load_artifacts(model_type: str, model_assets: Path) -> tuple[TfidfVectorizer, VotingClassifier]:
+    """
+    Load the tier's vectorizer and trained ensemble model.
+
+    Args:
+        model_type: Type of model to prune
+        model_assets: Path to model assets directory
+
+    Returns:
+        Tuple containing the vectorizer and the model
+
+    Raises:
+        FileNotFoundError: If either file is not found
+    """
+    vectorizer = joblib.load(model_assets / "vectorizers" / f"ld_{model_type}_vectorizer.joblib")
+    model = joblib.load(model_assets / "models" / f"ld_{model_type}_ensemble_model.joblib")
+    return vectorizer, model
+
+
+def load_validation_data(model_type: str, base: Path) -> tuple[csr_matrix, np.ndarray]:
+    """
+    Load the validation rows held out of training by split_data.py --validation.
+
+    The threshold is judged on these rather than on the test rows, which
+    run_test_data.py reports on afterwards.
+
+    Args:
+        model_type: Type of model to prune
+        base: Base directory for data files
+
+    Returns:
+        Tuple containing the validation features and labels
+
+    Raises:
+        ValueError: If the split file has no validation rows
+    """
+    split_file = base / "data/processed/split" / f"ld_{model_type}_split.npz"
+    matrix_dir = base / "data/processed/vectorized" / f"ld_vectorized_{model_type}_data"
+    try:
+        X_val, y_val = load_split(matrix_dir, split_file, "validation")
+    except KeyError:
+        raise ValueError(f"{split_file} has no validation rows; rerun split_data.py with --validation and train_model.py")
+    logger.info(f"Loaded {X_val.shape[0]} {model_type} validation samples")
+    return X_val, y_val
+
+
+def logreg_coefficients(model: VotingClassifier) -> np.ndarray:
+    """
+    Stack the coefficients of the ensemble's logistic regression half.
+
+    One-vs-rest fits a constant predictor without coefficients for a class column
+    holding a single value; it contributes a zero row.
+
+    Args:
+        model: The trained ensemble model
+
+    Returns:
+        Array of shape (n_classes, n_features)
+    """
+    logreg = model.named_estimators_["logreg"]
+    if not isinstance(logreg, OneVsRestClassifier):
+        return logreg.coef_
+    return np.vstack([
+        e.coef_ if hasattr(e, "coef_") else np.zeros((1, logreg.n_features_in_))
+        for e in logreg.estimators_
+    ])
+
+
+def column_importance(model: VotingClassifier) -> np.ndarray:
+    """
+    Score every feature column by its largest influence in either half of the ensemble.
+
+    For the logistic regression this is the largest absolute coefficient across
+    classes. For ComplementNB it is the spread of the column's log-probability
+    weights across classes, since a weight shared by all classes cannot change
+    the prediction. Each score is scaled by its maximum so the halves are comparable.
+
+    Args:
+        model: The trained ensemble model
+
+    Returns:
+        Importance in [0, 1] per feature column
+    """
+    lr = np.abs(logreg_coefficients(model)).max(axis=0)
+    nb = np.ptp(model.named_estimators_["nb"].feature_log_prob_, axis=0)
+    return np.maximum(lr / max(lr.max(), 1e-12), nb / max(nb.max(), 1e-12))
+
+
+def select_columns(model: VotingClassifier, n_vocabulary: int, threshold: float) -> np.ndarray:
+    """
+    Choose which columns to keep.
+
+    Only TF-IDF columns are pruned; the extended feature block after them is always kept.
+
+    Args:
+        model: The trained ensemble model
+        n_vocabulary: Number of TF-IDF columns at the start of the feature matrix
+        threshold: Minimum relative importance of a kept TF-IDF column
+
+    Returns:
+        Sorted indices of the kept columns
+    """
+    importance = column_importance(model)
+    kept_vocabulary = np.flatnonzero(importance[:n_vocabulary] >= threshold)
+    extended = np.arange(n_vocabulary, len(importance))
+    return np.concatenate([kept_vocabulary, extended])
+
+
+def prune_vectorizer(vectorizer: TfidfVectorizer, kept_vocabulary: np.ndarray) -> TfidfVectorizer:
+    """
+    Restrict a fitted vectorizer to a subset of its vocabulary, in place.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        kept_vocabulary: Sorted column indices of the terms to keep
+
+    Returns:
+        The pruned vectorizer
+    """
+    terms = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+
+    idf = vectorizer.idf_[kept_vocabulary]
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms[kept_vocabulary])}
+    vectorizer.idf_ = idf
+    vectorizer._tfidf.n_features_in_ = len(kept_vocabulary)
+    return vectorizer
+
+
+def prune_model(model: VotingClassifier, kept: np.ndarray) -> VotingClassifier:
+    """
+    Drop feature columns from both halves of a fitted ensemble, in place.
+
+    Args:
+        model: The trained ensemble model
+        kept: Sorted indices of the columns to keep
+
+    Returns:
+        The pruned model
+    """
+    nb = model.named_estimators_["nb"]
+    nb.feature_count_ = nb.feature_count_[:, kept]
+    nb.feature_all_ = nb.feature_all_[kept]
+    nb.feature_log_prob_ = nb.feature_log_prob_[:, kept]
+    nb.n_features_in_ = len(kept)
+
+    logreg = model.named_estimators_["logreg"]
+    estimators = logreg.estimators_ if isinstance(logreg, OneVsRestClassifier) else [logreg]
+    for estimator in estimators:
+        # One-vs-rest constant predictors have no coefficients to slice
+        if hasattr(estimator, "coef_"):
+            estimator.coef_ = np.ascontiguousarray(estimator.coef_[:, kept])
+        estimator.n_features_in_ = len(kept)
+    logreg.n_features_in_ = len(kept)
+    return model
+
+
+def prune_features(X: csr_matrix, kept: np.ndarray, n_vocabulary: int) -> csr_matrix:
+    """
+    Reproduce what the pruned vectorizer would output for already vectorized rows.
+
+    The vectorizer L2-normalizes over the terms it knows, so the kept TF-IDF columns
+    are renormalized after slicing. The extended block is passed through unchanged.
+
+    Args:
+        X: Features built with the full vectorizer
+        kept: Sorted indices of the kept columns
+        n_vocabulary: Number of TF-IDF columns in X
+
+    Returns:
+        Features matching the pruned vectorizer and model
+    """
+    return renormalize_vocabulary(csr_matrix(X)[:, kept], int((kept < n_vocabulary).sum()))
+
+
+def renormalize_vocabulary(X: csr_matrix, n_vocabulary: int) -> csr_matrix:
+    """
+    L2-normalize the TF-IDF columns of already sliced rows, leaving the extended block as is.
+
+    Args:
+        X: Rows restricted to the kept columns
+        n_vocabulary: Number of TF-IDF columns at the start of X
+
+    Returns:
+        Rows as the pruned vectorizer would output them
+    """
+    X = csr_matrix(X)
+    return hstack(
+        [normalize(X[:, :n_vocabulary]), X[:, n_vocabulary:]], format="csr"
+    ).astype(X.dtype, copy=False)
+
+
+def rewrite_vectorized_data(model_type: str, base: Path, kept: np.ndarray, n_kept_vocabulary: int) -> None:
+    """
+    Replace the tier's vectorized matrix with its pruned columns.
+
+    The later steps (run_test_data.py, export_quantized_model.py and another pruning
+    pass) read the matrix directly, so it has to match the pruned vectorizer and model.
+    Row order is unchanged, so the split indices stay valid.
+
+    Args:
+        model_type: Type of model being pruned
+        base: Base directory for data files
+        kept: Sorted indices of the kept columns
+        n_kept_vocabulary: Number of kept TF-IDF columns
+    """
+    matrix_dir = base / "data/processed/vectorized" / f"ld_vectorized_{model_type}_data"
+    staging_dir = matrix_dir.with_name(matrix_dir.name + ".pruned")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    logger.info(f"Writing pruned {model_type} vectorized data to {matrix_dir}")
+    X, y = load_csr(matrix_dir)
+    save_columns(staging_dir, X, y, kept, transform=lambda chunk: renormalize_vocabulary(chunk, n_kept_vocabulary))
+    del X, y  # release the memory maps before replacing their files
+
+    shutil.rmtree(matrix_dir)
+    staging_dir.rename(matrix_dir)
+
+
+def prune_tier(model_type: str, model_dir: str, threshold: float = PRUNE_THRESHOLD) -> None:
+    """
+    Prune low-importance columns from a tier's vectorizer and model and report the validation accuracy change.
+
+    Args:
+        model_type: Type of model to prune
+        model_dir: Path to model assets directory
+        threshold: Minimum relative importance of a kept TF-IDF column
+
+    Raises:
+        Exception: If pruning fails
+    """
+    model_assets = Path(model_dir)
+    base = Path(__file__).resolve().parents[1]
+    vectorizer_file = model_assets / "vectorizers" / f"ld_{model_type}_vectorizer.joblib"
+    model_file = model_assets / "models" / f"ld_{model_type}_ensemble_model.joblib"
+
+    vectorizer, model = load_artifacts(model_type, model_assets)
+    X_val, y_val = load_validation_data(model_type, base)
+
+    # Recorded before pruning so train_model.py can still warm start from the pruned model
+    # once vectorize_training_data.py has rebuilt the full vocabulary
+    unpruned_layout = getattr(model, "unpruned_layout_", None) or feature_layout_fingerprint(vectorizer, model_type)
+    previously_kept = getattr(model, "kept_columns_", None)
+
+    n_vocabulary = len(vectorizer.vocabulary_)
+    kept = select_columns(model, n_vocabulary, threshold)
+    n_kept_vocabulary = int((kept < n_vocabulary).sum())
+    logger.info(f"Keeping {n_kept_vocabulary:,} of {n_vocabulary:,} {model_type} vocabulary columns at threshold {threshold}")
+
+    accuracy_before = float((model.predict(X_val) == y_val).mean())
+    size_before = vectorizer_file.stat().st_size + model_file.stat().st_size
+
+    prune_model(model, kept)
+    prune_vectorizer(vectorizer, kept[kept < n_vocabulary])
+    accuracy_after = float((model.predict(prune_features(X_val, kept, n_vocabulary)) == y_val).mean())
+
+    delta = accuracy_after - accuracy_before
+    logger.info(f"Validation accuracy for {model_type}: {accuracy_before:.4f} -> {accuracy_after:.4f} ({delta:+.4f})")
+    if -delta > MAX_ACCURACY_DROP:
+        logger.warning(
+            f"Accuracy dropped by {-delta:.4f}, more than the allowed {MAX_ACCURACY_DROP}; "
+            "keeping the unpruned artifacts. Try a lower threshold."
+        )
+        return
+
+    rewrite_vectorized_data(model_type, base, kept, n_kept_vocabulary)
+
+    # The columns changed, so a later warm start has to map them back to the unpruned layout
+    model.feature_layout_ = feature_layout_fingerprint(vectorizer, model_type)
+    model.unpruned_layout_ = unpruned_layout
+    model.kept_columns_ = kept if previously_kept is None else previously_kept[kept]
+    joblib.dump(vectorizer, vectorizer_file)
+    joblib.dump(model, model_file)
+
+    size_after = vectorizer_file.stat().st_size + model_file.stat().st_size
+    logger.info(f"Artifact size for {model_type}: {size_before / 2**20:.2f} MiB -> {size_after / 2**20:.2f} MiB")
+
+
+def main() -> None:
+    """Main entry point for command line usage."""
+    if len(sys.argv) not in (3, 4):
+        logger.error("Usage: python prune_model.py <model_type> <model_dir> [threshold]")
+        sys.exit(1)
+
+    model_type = sys.argv[1]
+    model_dir = sys.argv[2]
+    threshold = float(sys.argv[3]) if len(sys.argv) == 4 else PRUNE_THRESHOLD
+
+    try:
+        prune_tier(model_type, model_dir, threshold)
+        logger.info(f"Model pruning completed successfully for {model_type}")
+    except Exception as e:
+        logger.error(f"Model pruning failed for {model_type}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,11 @@ Source: https://wortschatz.uni-leipzig.de/en/download
 License: https://creativecommons.org/licenses/by/4.0/
 """
 
+import hashlib
+import json
 import logging
 import sys
+import time
 from pathlib import Path
 from typing import Tuple, Optional
 
@@ -16,23 +19,42 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.ensemble import VotingClassifier
 from sklearn.metrics import classification_report, ConfusionMatrixDisplay
+from sklearn.model_selection import train_test_split
 from sklearn.multiclass import OneVsRestClassifier
 from sklearn.pipeline import Pipeline
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, hstack
+from sklearn.feature_extraction.text import TfidfVectorizer
 
+from utils.build_extended_features_block import build_extended_features_block
+from utils.memory_usage import current_rss_bytes
+from utils.ngram_features import SharedNGrams
+from utils.quantized_model import quantized_model_path
+from utils.sparse_storage import load_csr
+from vectorize_training_data import load_dataset
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+RANDOM_STATE = 42
+PREDICT_CHUNK_SIZE = 100_000
+CACHE_DIGEST_BLOCK_SIZE = 1 << 20
 
-def load_test_data(model_type: str, base: Path) -> Tuple[csr_matrix, np.ndarray]:
+# Inference cost measurement
+LATENCY_ROWS = 500
+LATENCY_BATCH_SIZE = 1_000
+LATENCY_BATCHES = 20
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def load_test_data(model_type: str, base: Path, sample_size: Optional[int] = None) -> Tuple[csr_matrix, np.ndarray]:
     """
     Load test data from disk.
     
     Args:
         model_type: Type of model to load test data for
         base: Base directory for data files
+        sample_size: If given, load a stratified sample of at most this many test rows
         
     Returns:
         Tuple containing test features and labels
@@ -42,9 +64,21 @@ def load_test_data(model_type: str, base: Path) -> Tuple[csr_matrix, np.ndarray]
         Exception: If there is an error loading the data
     """
     try:
-        data_file = base / "data/processed/split" / f"ld_{model_type}_test_data.joblib"
+        data_file = base / "data/processed/split" / f"ld_{model_type}_split.npz"
         logger.info(f"Loading {model_type} test data from {data_file}")
-        X_test, y_test = joblib.load(data_file)
+        with np.load(data_file) as splits:
+            rows = splits["test"]
+        X, y = load_csr(base / "data/processed/vectorized" / f"ld_vectorized_{model_type}_data")
+
+        if sample_size is not None and sample_size < len(rows):
+            # Only the sampled rows are read from the memory-mapped matrix
+            rows, _ = train_test_split(
+                rows, train_size=sample_size, stratify=y[rows], random_state=RANDOM_STATE
+            )
+            rows = np.sort(rows)
+            logger.info(f"Evaluating a stratified sample of {len(rows)} test rows")
+
+        X_test, y_test = X[rows], np.asarray(y[rows])
         logger.info(f"Successfully loaded {X_test.shape[0]} test samples with {X_test.shape[1]} features")
         return X_test, y_test
     except FileNotFoundError:
@@ -55,6 +89,23 @@ def load_test_data(model_type: str, base: Path) -> Tuple[csr_matrix, np.ndarray]
         raise
 
 
+def load_test_texts(model_type: str, base: Path, n_texts: int) -> np.ndarray:
+    """
+    Load the raw strings of the first test rows, for timing inference from text.
+
+    Args:
+        model_type: Type of model to load test strings for
+        base: Base directory for data files
+        n_texts: Maximum number of strings to load
+
+    Returns:
+        Array of strings, in test row order
+    """
+    with np.load(base / "data/processed/split" / f"ld_{model_type}_split.npz") as splits:
+        rows = splits["test"][:n_texts]
+    return load_dataset(base, model_type, rows)["text"].to_numpy()
+
+
 def load_trained_model(model_type: str, model_assets: Path) -> VotingClassifier:
     """
     Load the trained ensemble model from disk.
@@ -84,22 +135,273 @@ def load_trained_model(model_type: str, model_assets: Path) -> VotingClassifier:
         raise
 
 
-def create_confusion_matrix(model: VotingClassifier, X_test: np.ndarray, y_test: np.ndarray, 
+def prediction_cache_key(X_test: csr_matrix, y_test: np.ndarray, model_file: Path, vectorizer_file: Path) -> str:
+    """
+    Fingerprint everything cached test predictions depend on.
+
+    The test matrix and the vectorizer are hashed by content, so re-vectorizing or
+    resampling the test set invalidates the cache even when the shape and labels
+    happen to match. The model is keyed by its file's size and modification time,
+    which every retrain changes.
+
+    Args:
+        X_test: Test features
+        y_test: Test labels
+        model_file: Path the model was loaded from
+        vectorizer_file: Path of the vectorizer the test features were produced with
+
+    Returns:
+        Hex digest identifying the predictions
+    """
+    digest = hashlib.sha256()
+    X_test = csr_matrix(X_test)
+    digest.update(np.asarray(X_test.shape, dtype=np.int64).tobytes())
+    for name in ("data", "indices", "indptr"):
+        digest.update(np.ascontiguousarray(getattr(X_test, name)).tobytes())
+    digest.update("\0".join(np.asarray(y_test).astype(str)).encode("utf-8"))
+
+    with open(vectorizer_file, "rb") as f:
+        while block := f.read(CACHE_DIGEST_BLOCK_SIZE):
+            digest.update(block)
+
+    stat = model_file.stat()
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def predict_test_data(model: VotingClassifier, X_test: csr_matrix, y_test: np.ndarray,
+                      cache_key: str, cache_file: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predict class probabilities for the test set once, reusing a cached result when valid.
+
+    Predicted labels are the argmax of the probabilities, which is what the
+    soft-voting model's predict does.
+
+    Args:
+        model: The trained model to evaluate
+        X_test: Test features
+        y_test: Test labels
+        cache_key: Fingerprint from prediction_cache_key; a cache with any other key is ignored
+        cache_file: .npz file to read and write cached predictions
+
+    Returns:
+        Tuple containing predicted labels and class probabilities
+    """
+    key = np.array(cache_key)
+
+    if cache_file.exists():
+        with np.load(cache_file, allow_pickle=False) as cached:
+            if cached["key"] == key:
+                logger.info(f"Using cached predictions from {cache_file}")
+                return cached["y_pred"], cached["proba"]
+
+    logger.info(f"Predicting {X_test.shape[0]} test samples")
+    start = time.perf_counter()
+    proba = np.vstack([
+        model.predict_proba(X_test[i:i + PREDICT_CHUNK_SIZE])
+        for i in range(0, X_test.shape[0], PREDICT_CHUNK_SIZE)
+    ])
+    y_pred = np.asarray(model.classes_)[proba.argmax(axis=1)]
+    logger.info(f"Prediction took {time.perf_counter() - start:.1f}s")
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_file, key=key, y_pred=y_pred.astype(str), proba=proba)
+    logger.info(f"Predictions cached to {cache_file}")
+    return y_pred.astype(str), proba
+
+
+def artifact_paths(model_type: str, model_assets: Path) -> dict[str, Path]:
+    """
+    Paths of the serialized artifacts a tier needs at inference time.
+
+    Args:
+        model_type: Type of model being evaluated
+        model_assets: Path to model assets directory
+
+    Returns:
+        Mapping of artifact name to path
+    """
+    return {
+        "model": model_assets / "models" / f"ld_{model_type}_ensemble_model.joblib",
+        "vectorizer": model_assets / "vectorizers" / f"ld_{model_type}_vectorizer.joblib",
+        "tell_lists": model_assets / "tell_lists" / f"ld_{model_type}_tell_lists.joblib",
+        "quantized": quantized_model_path(model_assets, model_type),
+    }
+
+
+def load_model_with_cost(model_type: str, model_assets: Path) -> Tuple[VotingClassifier, Optional[TfidfVectorizer], dict]:
+    """
+    Load the tier's model and vectorizer, measuring artifact sizes, load time and memory.
+
+    Args:
+        model_type: Type of model to load
+        model_assets: Path to model assets directory
+
+    Returns:
+        Tuple containing the trained ensemble model, its vectorizer (None if missing) and a dict of load costs
+    """
+    paths = artifact_paths(model_type, model_assets)
+    rss_before = current_rss_bytes()
+
+    start = time.perf_counter()
+    ensemble_model = load_trained_model(model_type, model_assets)
+    load_seconds = {"model": time.perf_counter() - start}
+
+    # The vectorizer is loaded alongside the model in production, so it counts towards the cost
+    if paths["vectorizer"].exists():
+        start = time.perf_counter()
+        vectorizer = joblib.load(paths["vectorizer"])
+        load_seconds["vectorizer"] = time.perf_counter() - start
+    else:
+        vectorizer = None
+
+    rss_after = current_rss_bytes()
+
+    cost = {
+        "artifact_bytes": {name: path.stat().st_size for name, path in paths.items() if path.exists()},
+        "load_seconds": load_seconds,
+        "rss_after_load_bytes": rss_after,
+        "rss_load_delta_bytes": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+    }
+    return ensemble_model, vectorizer, cost
+
+
+def latency_percentiles(seconds, scale: float = 1.0) -> dict[str, float]:
+    """Percentiles of timings in milliseconds, divided by scale (e.g. rows per batch)."""
+    values = np.asarray(seconds) * 1000 / scale
+    return {f"p{p}": float(np.percentile(values, p)) for p in LATENCY_PERCENTILES}
+
+
+def measure_predict_latency(model: VotingClassifier, X_test: csr_matrix) -> dict:
+    """
+    Time predict_proba on single rows and on batches of already vectorized test rows.
+
+    This is the model's share of inference only; measure_text_latency times the
+    whole path from a raw string.
+
+    Args:
+        model: The trained model to measure
+        X_test: Test features
+
+    Returns:
+        Dict of latency percentiles in milliseconds, for single rows, whole batches and per row within a batch
+    """
+    n_rows = X_test.shape[0]
+
+    single = []
+    for i in range(min(LATENCY_ROWS, n_rows)):
+        row = X_test[i:i + 1]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        single.append(time.perf_counter() - start)
+
+    batched = []
+    batch_size = min(LATENCY_BATCH_SIZE, n_rows)
+    for start_row in range(0, min(LATENCY_BATCHES * batch_size, n_rows - batch_size + 1), batch_size):
+        batch = X_test[start_row:start_row + batch_size]
+        start = time.perf_counter()
+        model.predict_proba(batch)
+        batched.append(time.perf_counter() - start)
+
+    return {
+        "single_row_ms": latency_percentiles(single),
+        "batch_size": batch_size,
+        "batch_ms": latency_percentiles(batched),
+        "batch_per_row_ms": latency_percentiles(batched, batch_size),
+    }
+
+
+def measure_text_latency(model: VotingClassifier, vectorizer: TfidfVectorizer, model_type: str,
+                         texts: np.ndarray) -> dict:
+    """
+    Time single raw strings through the same steps as language_detector.evaluate_input.
+
+    Each string is counted into n-grams, TF-IDF weighted, given its extended feature
+    block and predicted; the featurization and prediction shares are timed separately.
+
+    Args:
+        model: The trained model to measure
+        vectorizer: The tier's vectorizer
+        model_type: Type of model, which selects the extended features
+        texts: Raw test strings
+
+    Returns:
+        Dict of latency percentiles in milliseconds for the whole path, featurization only and prediction only
+    """
+    featurize, predict = [], []
+    for text in texts:
+        start = time.perf_counter()
+        X_base = SharedNGrams(text).transform(vectorizer)
+        X_ext = build_extended_features_block([text], model_type).astype(X_base.dtype, copy=False)
+        X = hstack([X_base, X_ext], format="csr")
+        featurized = time.perf_counter()
+        model.predict_proba(X)
+        predict.append(time.perf_counter() - featurized)
+        featurize.append(featurized - start)
+
+    return {
+        "n_texts": len(texts),
+        "end_to_end_ms": latency_percentiles(np.add(featurize, predict)),
+        "featurize_ms": latency_percentiles(featurize),
+        "predict_ms": latency_percentiles(predict),
+    }
+
+
+def format_inference_cost(cost: dict) -> str:
+    """
+    Render inference cost measurements as text for the report.
+
+    Args:
+        cost: Load costs from load_model_with_cost, plus "latency" from measure_predict_latency
+            and, when test strings were available, "text_latency" from measure_text_latency
+
+    Returns:
+        Multi-line text block
+    """
+    lines = ["Inference cost", ""]
+    for name, size in cost["artifact_bytes"].items():
+        lines.append(f"Artifact size ({name}): {size / 2**20:.2f} MiB")
+    for name, seconds in cost["load_seconds"].items():
+        lines.append(f"Load time ({name}): {seconds * 1000:.1f} ms")
+    if cost["rss_after_load_bytes"] is not None:
+        lines.append(f"Resident memory after load: {cost['rss_after_load_bytes'] / 2**20:.1f} MiB")
+    if cost["rss_load_delta_bytes"] is not None:
+        lines.append(f"Resident memory added by load: {cost['rss_load_delta_bytes'] / 2**20:.1f} MiB")
+
+    latency = cost["latency"]
+    rows = [
+        ("Single-row predict (model only)", latency, "single_row_ms"),
+        (f"Batch predict ({latency['batch_size']} rows, model only)", latency, "batch_ms"),
+        ("Batch predict per row (model only)", latency, "batch_per_row_ms"),
+    ]
+    if "text_latency" in cost:
+        text_latency = cost["text_latency"]
+        rows += [
+            (f"Single string end to end ({text_latency['n_texts']} strings)", text_latency, "end_to_end_ms"),
+            ("Single string featurization", text_latency, "featurize_ms"),
+            ("Single string predict", text_latency, "predict_ms"),
+        ]
+    for label, measurements, key in rows:
+        values = ", ".join(f"{p} {v:.3f} ms" for p, v in measurements[key].items())
+        lines.append(f"{label}: {values}")
+    return "\n".join(lines) + "\n"
+
+
+def create_confusion_matrix(y_test: np.ndarray, y_pred: np.ndarray,
                           model_type: str, results_dir: Path) -> None:
     """
     Create and save confusion matrix visualization.
     
     Args:
-        model: The trained model to evaluate
-        X_test: Test features
         y_test: Test labels
+        y_pred: Predicted labels
         model_type: Type of model being evaluated
         results_dir: Directory to save results
     """
     logger.info(f"Creating confusion matrix for {model_type}")
     
-    disp = ConfusionMatrixDisplay.from_estimator(
-        model, X_test, y_test, cmap="Blues", colorbar=True
+    disp = ConfusionMatrixDisplay.from_predictions(
+        y_test, y_pred, cmap="Blues", colorbar=True
     )
     
     output_path = results_dir / f"{model_type}_confusion_matrix.png"
@@ -109,26 +411,29 @@ def create_confusion_matrix(model: VotingClassifier, X_test: np.ndarray, y_test:
     logger.info(f"Confusion matrix saved to {output_path}")
 
 
-def generate_classification_report(model: VotingClassifier, X_test: np.ndarray, y_test: np.ndarray,
-                                 model_type: str, results_dir: Path) -> None:
+def generate_classification_report(y_test: np.ndarray, y_pred: np.ndarray, proba: np.ndarray,
+                                 model_type: str, results_dir: Path, cost: Optional[dict] = None) -> None:
     """
-    Generate and save classification report.
+    Generate and save classification report, as text and as a JSON sidecar.
     
     Args:
-        model: The trained model to evaluate
-        X_test: Test features
         y_test: Test labels
+        y_pred: Predicted labels
+        proba: Predicted class probabilities
         model_type: Type of model being evaluated
         results_dir: Directory to save results
+        cost: Inference cost measurements to include in the report
     """
     logger.info(f"Generating classification report for {model_type}")
     
-    # Generate predictions
-    y_pred = model.predict(X_test)
     report = classification_report(y_test, y_pred)
     
     # Calculate accuracy
-    accuracy = model.score(X_test, y_test)
+    correct = y_test == y_pred
+    accuracy = correct.mean()
+
+    # Confidence of the chosen class, split by whether the prediction was right
+    confidence = proba.max(axis=1)
     
     # Save report to file
     report_file = results_dir / f"{model_type}_report.txt"
@@ -137,17 +442,40 @@ def generate_classification_report(model: VotingClassifier, X_test: np.ndarray,
         f.write(report)
         f.write("\n\n")
         f.write(f"Test accuracy: {accuracy:.4f} ({accuracy*100:.2f}%)\n")
+        f.write(f"Test samples: {len(y_test)}\n")
+        if correct.any():
+            f.write(f"Mean confidence when correct: {confidence[correct].mean():.4f}\n")
+        if not correct.all():
+            f.write(f"Mean confidence when wrong: {confidence[~correct].mean():.4f}\n")
+        if cost is not None:
+            f.write("\n")
+            f.write(format_inference_cost(cost))
+
+    summary = {
+        "model_type": model_type,
+        "test_samples": int(len(y_test)),
+        "accuracy": float(accuracy),
+        "classification_report": classification_report(y_test, y_pred, output_dict=True),
+        "inference_cost": cost,
+    }
+    json_file = results_dir / f"{model_type}_report.json"
+    with open(json_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
     
-    logger.info(f"Classification report saved to {report_file}")
+    logger.info(f"Classification report saved to {report_file} and {json_file}")
     logger.info(f"Test accuracy: {accuracy:.4f} ({accuracy*100:.2f}%)")
 
-def run_test_evaluation(model_type: str, model_dir: str) -> None:
+def run_test_evaluation(model_type: str, model_dir: str, sample_size: Optional[int] = None) -> None:
     """
     Main function to run test evaluation on a trained model.
+
+    The test set is predicted once; the confusion matrix and report are both
+    derived from those predictions.
     
     Args:
         model_type: Type of model to evaluate
         model_dir: Path to model assets directory
+        sample_size: If given, evaluate a stratified sample of at most this many test rows
         
     Raises:
         Exception: If evaluation fails
@@ -162,14 +490,36 @@ def run_test_evaluation(model_type: str, model_dir: str) -> None:
         results_dir.mkdir(parents=True, exist_ok=True)
         
         # Load test data and model
-        X_test, y_test = load_test_data(model_type, base)
-        ensemble_model = load_trained_model(model_type, model_assets)
+        X_test, y_test = load_test_data(model_type, base, sample_size)
+        ensemble_model, vectorizer, cost = load_model_with_cost(model_type, model_assets)
+
+        # Predict once; everything below is derived from these predictions
+        # Cached with the training data rather than in model_assets, which is bundled with the app
+        artifacts = artifact_paths(model_type, model_assets)
+        cache_key = prediction_cache_key(X_test, y_test, artifacts["model"], artifacts["vectorizer"])
+        y_pred, proba = predict_test_data(
+            ensemble_model,
+            X_test,
+            y_test,
+            cache_key,
+            base / "data/processed/predictions" / f"ld_{model_type}_predictions.npz",
+        )
+        y_test = y_test.astype(str)
         
         # Generate confusion matrix
-        create_confusion_matrix(ensemble_model, X_test, y_test, model_type, results_dir)
+        create_confusion_matrix(y_test, y_pred, model_type, results_dir)
         
+        # Measure inference cost
+        cost["latency"] = measure_predict_latency(ensemble_model, X_test)
+        if vectorizer is not None:
+            try:
+                texts = load_test_texts(model_type, base, LATENCY_ROWS)
+                cost["text_latency"] = measure_text_latency(ensemble_model, vectorizer, model_type, texts)
+            except FileNotFoundError as e:
+                logger.warning(f"Skipping end-to-end latency, raw test strings not found: {e}")
+
         # Generate classification report
-        generate_classification_report(ensemble_model, X_test, y_test, model_type, results_dir)
+        generate_classification_report(y_test, y_pred, proba, model_type, results_dir, cost)
         
         # Analyze feature importance (optional)
         # analyze_feature_importance(ensemble_model, model_assets, model_type)
@@ -337,15 +687,16 @@ def analyze_feature_importance(ensemble_model: VotingClassifier, model_assets: P
 
 def main() -> None:
     """Main entry point for command line usage."""
-    if len(sys.argv) != 3:
-        logger.error("Usage: python run_test_data.py <model_type> <model_dir>")
+    if len(sys.argv) not in (3, 5) or (len(sys.argv) == 5 and sys.argv[3] != "--sample"):
+        logger.error("Usage: python run_test_data.py <model_type> <model_dir> [--sample <n_rows>]")
         sys.exit(1)
     
     model_type = sys.argv[1]
     model_dir = sys.argv[2]
+    sample_size = int(sys.argv[4]) if len(sys.argv) == 5 else None
     
     try:
-        run_test_evaluation(model_type, model_dir)
+        run_test_evaluation(model_type, model_dir, sample_size)
         logger.info("Test evaluation completed successfully")
     except Exception as e:
         logger.error(f"Test evaluation failed: {e}")
@@ -11,9 +11,11 @@ import sys
 from pathlib import Path
 from typing import Tuple, Any
 
-import joblib
+import numpy as np
 from sklearn.model_selection import train_test_split
 
+from utils.sparse_storage import load_csr, save_split
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -22,6 +24,8 @@ logger = logging.getLogger(__name__)
 
 # Constants
 TEST_SIZE = 0.05
+# Share of all rows held out of training with --validation, for choosing the pruning threshold (prune_model.py)
+VALIDATION_SIZE = 0.05
 RANDOM_STATE = 42
 
 
@@ -31,12 +35,16 @@ class DataSplitError(Exception):
     pass
 
 
-def split_data(model_type: str) -> None:
+def split_data(model_type: str, validation: bool = False) -> None:
     """
     Split data into training and test sets.
 
+    Only the labels are read; the vectorized matrix stays on disk and each split is
+    stored as row indices into it.
+
     Args:
         model_type: Type of model to split data for (e.g., 'family', 'cyrillic')
+        validation: Also carve a validation split out of the training rows, which is never trained on
 
     Raises:
         DataSplitError: If data splitting fails
@@ -45,10 +53,10 @@ def split_data(model_type: str) -> None:
 
     try:
         logger.info(f"Loading {model_type} data")
-        X, y = joblib.load(
+        X, y = load_csr(
             base_path
             / "data/processed/vectorized"
-            / f"ld_vectorized_{model_type}_data.joblib"
+            / f"ld_vectorized_{model_type}_data"
         )
 
         if X.shape[0] == 0 or len(y) == 0:
@@ -56,31 +64,38 @@ def split_data(model_type: str) -> None:
 
     except FileNotFoundError:
         raise DataSplitError(f"Vectorized data file not found for {model_type}")
+    except DataSplitError:
+        raise
     except Exception as e:
         raise DataSplitError(f"Failed to load data for {model_type}: {e}")
 
     logger.info(f"Splitting {model_type} data with test_size={TEST_SIZE}")
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+    train_rows, test_rows = train_test_split(
+        np.arange(X.shape[0]), test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
     )
 
+    validation_rows = None
+    if validation:
+        logger.info(f"Holding out validation_size={VALIDATION_SIZE} of the {model_type} rows for validation")
+        train_rows, validation_rows = train_test_split(
+            train_rows,
+            test_size=VALIDATION_SIZE / (1 - TEST_SIZE),
+            random_state=RANDOM_STATE,
+            stratify=y[train_rows],
+        )
+
     logger.info(
-        f"Split complete: {X_train.shape[0]} training, {X_test.shape[0]} test samples"
+        f"Split complete: {len(train_rows)} training, "
+        f"{0 if validation_rows is None else len(validation_rows)} validation, {len(test_rows)} test samples"
     )
 
-    logger.info(f"Writing {model_type} split data to disk")
-
-    # Ensure output directory exists
-    output_dir = base_path / "data/processed/split"
-    output_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Writing {model_type} split indices to disk")
 
-    joblib.dump(
-        (X_train, y_train),
-        output_dir / f"ld_{model_type}_train_data.joblib",
-    )
-    joblib.dump(
-        (X_test, y_test),
-        output_dir / f"ld_{model_type}_test_data.joblib",
+    save_split(
+        base_path / "data/processed/split" / f"ld_{model_type}_split.npz",
+        train_rows,
+        test_rows,
+        validation_rows,
     )
 
     logger.info("Data split and save complete")
@@ -88,14 +103,15 @@ def split_data(model_type: str) -> None:
 
 def main() -> None:
     """Main entry point for command line usage."""
-    if len(sys.argv) != 2:
-        logger.error("Usage: python split_data.py <model_type>")
+    if len(sys.argv) not in (2, 3) or sys.argv[2:] not in ([], ["--validation"]):
+        logger.error("Usage: python split_data.py <model_type> [--validation]")
         sys.exit(1)
 
     model_type = sys.argv[1]
+    validation = sys.argv[2:] == ["--validation"]
 
     try:
-        split_data(model_type)
+        split_data(model_type, validation)
         logger.info("Data splitting completed successfully")
     except DataSplitError as e:
         logger.error(f"Data splitting failed: {e}")
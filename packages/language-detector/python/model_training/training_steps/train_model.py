@@ -7,28 +7,64 @@ Source: https://wortschatz.uni-leipzig.de/en/download
 License: https://creativecommons.org/licenses/by/4.0/
 """
 
+import copy
 import logging
+import shutil
 import sys
+import time
 from pathlib import Path
 
 import joblib
 import numpy as np
+from joblib import Parallel, delayed
 from scipy.sparse import csr_matrix
 
 from sklearn.naive_bayes import ComplementNB
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.ensemble import VotingClassifier
 from sklearn.multiclass import OneVsRestClassifier
+from sklearn.preprocessing import LabelBinarizer, LabelEncoder
+from sklearn.utils import Bunch, compute_class_weight
+
+from utils.sparse_storage import load_csr, save_rows
+from vectorize_training_data import feature_layout_fingerprint
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Ensemble hyperparameters (see tune_hyperparameters.py for searching them)
+NB_PARAMS = dict(alpha=0.3)
+LOGREG_PARAMS = dict(
+    max_iter=1000,
+    solver="saga",
+    penalty="l2",
+    C=2.0,
+    class_weight="balanced",
+    verbose=1,
+    tol=1e-3,
+)
+
+# Incremental (out-of-core) training settings
+CHUNK_SIZE = 100_000
+INCREMENTAL_EPOCHS = 5
+RANDOM_STATE = 42
+
 
 def load_data(model_type: str, base: Path) -> tuple[csr_matrix, np.ndarray]:
     """
-    Load training data from disk.
+    Load training data as a memory-mapped matrix that worker processes can share.
+
+    The training rows are copied chunk by chunk out of the vectorized matrix into
+    their own .npy files and reopened with mmap_mode="r". joblib passes memory-mapped
+    arrays to the OneVsRest workers by file reference, so every per-class fit reads
+    the same pages instead of receiving a pickled copy.
 
     Args:
         model_type: Type of model to load data for (e.g., 'family', 'cyrillic')
@@ -43,18 +79,43 @@ def load_data(model_type: str, base: Path) -> tuple[csr_matrix, np.ndarray]:
     """
     logger.info(f"Loading {model_type} training data")
     try:
-        data_file = base / "data/processed/split" / f"ld_{model_type}_train_data.joblib"
-        X_train, y_train = joblib.load(data_file)
+        X, y, train_rows = open_training_data(model_type, base)
+        shared_dir = shared_data_dir(model_type, base)
+        save_rows(shared_dir, X, y, train_rows, CHUNK_SIZE)
+        X_train, y_train = load_csr(shared_dir)
         logger.info(f"Successfully loaded {X_train.shape[0]} training samples with {X_train.shape[1]} features")
         return X_train, y_train
-    except FileNotFoundError:
-        logger.error(f"Data file not found: {data_file}")
+    except FileNotFoundError as e:
+        logger.error(f"Data file not found: {e.filename}")
         raise
     except Exception as e:
         logger.error(f"Failed to load data for {model_type}: {e}")
         raise
 
 
+def shared_data_dir(model_type: str, base: Path) -> Path:
+    """Directory holding the memory-mapped training matrix shared with worker processes."""
+    return base / "data/processed/shared" / f"ld_{model_type}_train_data"
+
+
+def log_peak_memory(model_type: str) -> None:
+    """
+    Log the peak resident memory of this process and of finished child processes.
+
+    Args:
+        model_type: Type of model being trained
+    """
+    if resource is None:
+        logger.info("Peak memory reporting is not available on this platform")
+        return
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2**20
+    logger.info(f"Peak memory for {model_type}: {own:,.0f} MiB (main process), {children:,.0f} MiB (largest finished worker)")
+
+
 def create_and_fit_model(X_train: csr_matrix, y_train: np.ndarray, model_type: str) -> VotingClassifier:
     """
     Create and train an ensemble model using the training data.
@@ -68,35 +129,344 @@ def create_and_fit_model(X_train: csr_matrix, y_train: np.ndarray, model_type: s
         The trained ensemble model
     """
     logger.info(f"Creating ensemble model for {model_type} with {X_train.shape[0]} samples")
-    
-    # Create base classifiers
-    nb_classifier = ComplementNB(alpha=0.3)
-    logreg_classifier = LogisticRegression(
-        max_iter=1000,
-        solver="saga",
-        penalty="l2",
-        C=2.0,
-        class_weight="balanced",
-        verbose=1,
-        tol=1e-3,
-    )
+    ensemble_model = build_ensemble_model()
 
-    # Create ensemble model
-    ensemble_model = VotingClassifier(
+    logger.info(f"Fitting {model_type} ensemble model")
+    ensemble_model.fit(X_train, y_train)
+    logger.info(f"Model training completed successfully")
+
+    return ensemble_model
+
+
+def build_ensemble_model(nb_params: dict | None = None, logreg_params: dict | None = None, n_jobs: int = -1) -> VotingClassifier:
+    """
+    Create the unfitted soft-voting ensemble of ComplementNB and one-vs-rest LogisticRegression.
+
+    Args:
+        nb_params: Overrides for NB_PARAMS
+        logreg_params: Overrides for LOGREG_PARAMS
+        n_jobs: Number of processes fitting the one-vs-rest classifiers
+
+    Returns:
+        The unfitted ensemble model
+    """
+    nb_classifier = ComplementNB(**{**NB_PARAMS, **(nb_params or {})})
+    logreg_classifier = LogisticRegression(**{**LOGREG_PARAMS, **(logreg_params or {})})
+
+    return VotingClassifier(
         estimators=[
             ("nb", nb_classifier),
-            ("logreg", OneVsRestClassifier(logreg_classifier, n_jobs=-1)),
+            ("logreg", OneVsRestClassifier(logreg_classifier, n_jobs=n_jobs)),
         ],
         voting="soft",
     )
 
-    logger.info(f"Fitting {model_type} ensemble model")
-    ensemble_model.fit(X_train, y_train)
+
+def current_feature_layout(model_assets: Path, model_type: str) -> str:
+    """
+    Fingerprint the feature layout of the vectorizer written by vectorize_training_data.
+
+    Args:
+        model_assets: Path to model assets directory
+        model_type: Type of model being trained
+
+    Returns:
+        Hex digest identifying the feature layout
+    """
+    vectorizer = joblib.load(model_assets / "vectorizers" / f"ld_{model_type}_vectorizer.joblib")
+    return feature_layout_fingerprint(vectorizer, model_type)
+
+
+def load_previous_model(model_assets: Path, model_type: str, feature_layout: str, classes: np.ndarray, n_features: int) -> VotingClassifier | None:
+    """
+    Load the saved ensemble model if it can seed a warm start.
+
+    A previous model qualifies when it was trained on the same feature layout and
+    the same set of classes, and its logistic regression is a fitted one-vs-rest model.
+    A model pruned by prune_model.py also qualifies when it was pruned from the current
+    layout; its coefficients are spread back over the unpruned columns, with the pruned
+    ones starting at zero.
+
+    Args:
+        model_assets: Path to model assets directory
+        model_type: Type of model being trained
+        feature_layout: Fingerprint of the current feature layout
+        classes: Sorted class labels of the current training data
+        n_features: Number of columns in the current training data
+
+    Returns:
+        The previous model, or None if training has to start from zero coefficients
+    """
+    model_file = model_assets / "models" / f"ld_{model_type}_ensemble_model.joblib"
+    if not model_file.exists():
+        logger.info(f"No previous {model_type} model at {model_file}, training from scratch")
+        return None
+
+    previous = joblib.load(model_file)
+    logreg = getattr(previous, "named_estimators_", {}).get("logreg")
+
+    same_layout = getattr(previous, "feature_layout_", None) == feature_layout
+    pruned_from_layout = getattr(previous, "unpruned_layout_", None) == feature_layout
+
+    if not same_layout and not pruned_from_layout:
+        if hasattr(previous, "unpruned_layout_"):
+            reason = "it was pruned from a different feature layout"
+        else:
+            reason = "the feature layout changed"
+    elif not np.array_equal(previous.classes_, classes):
+        reason = "the classes changed"
+    elif not isinstance(logreg, OneVsRestClassifier):
+        reason = "it has no one-vs-rest logistic regression"
+    else:
+        if not same_layout:
+            logger.info(
+                f"Previous {model_type} model was pruned to {len(previous.kept_columns_):,} of {n_features:,} columns; "
+                "restoring the unpruned columns with zero coefficients"
+            )
+            unprune_logreg(logreg, previous.kept_columns_, n_features)
+        logger.info(f"Warm starting {model_type} from {model_file}")
+        return previous
+
+    logger.info(f"Previous {model_type} model cannot seed a warm start because {reason}, training from scratch")
+    return None
+
+
+def unprune_logreg(logreg: OneVsRestClassifier, kept_columns: np.ndarray, n_features: int) -> None:
+    """
+    Spread pruned one-vs-rest coefficients back over the unpruned columns, in place.
+
+    Args:
+        logreg: Fitted one-vs-rest logistic regression of a pruned model
+        kept_columns: Unpruned column index of each of its columns
+        n_features: Number of unpruned columns
+    """
+    for estimator in logreg.estimators_:
+        if not hasattr(estimator, "coef_"):
+            continue
+        coef = np.zeros((estimator.coef_.shape[0], n_features), dtype=estimator.coef_.dtype)
+        coef[:, kept_columns] = estimator.coef_
+        estimator.coef_ = coef
+        estimator.n_features_in_ = n_features
+    logreg.n_features_in_ = n_features
+
+
+def _fit_binary_warm(previous_estimator, X: csr_matrix, y: np.ndarray) -> LogisticRegression:
+    """Refit one one-vs-rest classifier, starting from its previous coefficients when it has them."""
+    if not hasattr(previous_estimator, "coef_"):
+        return LogisticRegression(**LOGREG_PARAMS).fit(X, y)
+    # Copy so the previous model keeps its own convergence statistics for comparison
+    estimator = copy.deepcopy(previous_estimator)
+    estimator.set_params(**LOGREG_PARAMS, warm_start=True)
+    return estimator.fit(X, y)
+
+
+def create_and_fit_model_warm(X_train: csr_matrix, y_train: np.ndarray, previous: VotingClassifier, model_type: str) -> VotingClassifier:
+    """
+    Train the ensemble with each logistic regression initialized from a previous model.
+
+    VotingClassifier and OneVsRestClassifier clone their estimators before fitting,
+    which discards coefficients, so the per-class fits are run here directly with
+    warm_start=True and assembled into the same fitted structure. ComplementNB has
+    a closed-form fit and is retrained as usual.
+
+    Args:
+        X_train: Training data features (sparse matrix)
+        y_train: Training labels (numpy array)
+        previous: Model returned by load_previous_model
+        model_type: Type of model being trained
+
+    Returns:
+        The trained ensemble model
+    """
+    logger.info(f"Creating warm-started ensemble model for {model_type} with {X_train.shape[0]} samples")
+
+    le = LabelEncoder().fit(y_train)
+    encoded = le.transform(y_train)
+
+    nb_classifier = ComplementNB(**NB_PARAMS).fit(X_train, encoded)
+
+    logreg = OneVsRestClassifier(LogisticRegression(**LOGREG_PARAMS), n_jobs=-1)
+    logreg.label_binarizer_ = LabelBinarizer(sparse_output=True)
+    Y = logreg.label_binarizer_.fit_transform(encoded).tocsc()
+    logreg.classes_ = logreg.label_binarizer_.classes_
+    logreg.estimators_ = Parallel(n_jobs=logreg.n_jobs)(
+        delayed(_fit_binary_warm)(previous_estimator, X_train, column.toarray().ravel())
+        for previous_estimator, column in zip(previous.named_estimators_["logreg"].estimators_, Y.T)
+    )
+    logreg.n_features_in_ = X_train.shape[1]
+
+    ensemble_model = assemble_voting_classifier([("nb", nb_classifier), ("logreg", logreg)], le)
     logger.info(f"Model training completed successfully")
 
     return ensemble_model
 
 
+def log_convergence(model: VotingClassifier, model_type: str, previous: VotingClassifier | None = None) -> None:
+    """
+    Log how many saga iterations the one-vs-rest logistic regressions needed.
+
+    Args:
+        model: The trained model
+        model_type: Type of model being trained
+        previous: The model a warm start was seeded from, to compare against
+    """
+    def iterations(ensemble: VotingClassifier) -> np.ndarray | None:
+        logreg = ensemble.named_estimators_.get("logreg")
+        if not isinstance(logreg, OneVsRestClassifier):
+            return None
+        return np.array([int(np.max(e.n_iter_)) for e in logreg.estimators_ if hasattr(e, "n_iter_")])
+
+    n_iter = iterations(model)
+    if n_iter is None or len(n_iter) == 0:
+        return
+
+    max_iter = LOGREG_PARAMS["max_iter"]
+    logger.info(
+        f"Convergence for {model_type}: {n_iter.mean():.1f} mean / {n_iter.max()} max saga iterations per class, "
+        f"{int((n_iter >= max_iter).sum())} of {len(n_iter)} classes hit max_iter={max_iter}"
+    )
+
+    previous_iter = iterations(previous) if previous is not None else None
+    if previous_iter is not None and len(previous_iter) > 0:
+        logger.info(
+            f"Previous {model_type} model needed {previous_iter.mean():.1f} mean / {previous_iter.max()} max iterations; "
+            f"warm start used {n_iter.sum() / previous_iter.sum():.0%} of them"
+        )
+
+
+def open_training_data(model_type: str, base: Path) -> tuple[csr_matrix, np.ndarray, np.ndarray]:
+    """
+    Open the memory-mapped vectorized matrix and the training row indices without loading them.
+
+    Args:
+        model_type: Type of model to open data for (e.g., 'family', 'cyrillic')
+        base: Base directory for data files
+
+    Returns:
+        Tuple containing the memory-mapped matrix, all labels and the training row indices
+
+    Raises:
+        FileNotFoundError: If the matrix or split file is not found
+    """
+    logger.info(f"Opening memory-mapped {model_type} training data")
+    X, y = load_csr(base / "data/processed/vectorized" / f"ld_vectorized_{model_type}_data")
+    with np.load(base / "data/processed/split" / f"ld_{model_type}_split.npz") as splits:
+        train_rows = splits["train"]
+    logger.info(f"Opened {len(train_rows)} training samples with {X.shape[1]} features")
+    return X, y, train_rows
+
+
+def iter_row_chunks(rows: np.ndarray, rng: np.random.Generator | None = None):
+    """
+    Yield consecutive chunks of row indices, optionally in a shuffled chunk order.
+
+    Args:
+        rows: Sorted row indices to chunk
+        rng: If given, used to shuffle the chunk order (rows within a chunk stay sorted)
+
+    Yields:
+        Arrays of at most CHUNK_SIZE row indices
+    """
+    starts = np.arange(0, len(rows), CHUNK_SIZE)
+    if rng is not None:
+        rng.shuffle(starts)
+    for start in starts:
+        yield rows[start:start + CHUNK_SIZE]
+
+
+def create_and_fit_model_incremental(X: csr_matrix, y: np.ndarray, train_rows: np.ndarray, model_type: str) -> VotingClassifier:
+    """
+    Train the soft-voting ensemble by streaming row chunks from the memory-mapped matrix.
+
+    ComplementNB accumulates its counts in a single pass, and an SGD logistic model
+    (the out-of-core stand-in for the saga LogisticRegression) runs several epochs.
+    Only one chunk of rows is in memory at a time. The fitted estimators are
+    assembled into a VotingClassifier with the same interface as create_and_fit_model.
+
+    Args:
+        X: Memory-mapped feature matrix holding all rows
+        y: Labels for all rows
+        train_rows: Row indices of the training split
+        model_type: Type of model being trained
+
+    Returns:
+        The trained ensemble model
+    """
+    logger.info(f"Creating incremental ensemble model for {model_type} with {len(train_rows)} samples")
+
+    le = LabelEncoder().fit(y[train_rows])
+    classes = np.arange(len(le.classes_))
+    encoded = le.transform(y[train_rows])
+
+    # partial_fit cannot compute "balanced" weights itself, so derive them from the full split
+    class_weight = dict(
+        zip(classes, compute_class_weight("balanced", classes=classes, y=encoded))
+    )
+
+    nb_classifier = ComplementNB(**NB_PARAMS)
+    logreg_classifier = SGDClassifier(
+        loss="log_loss",
+        penalty=LOGREG_PARAMS["penalty"],
+        alpha=1.0 / (LOGREG_PARAMS["C"] * len(train_rows)),  # matches the saga model's C
+        class_weight=class_weight,
+        random_state=RANDOM_STATE,
+    )
+
+    rng = np.random.default_rng(RANDOM_STATE)
+    for epoch in range(INCREMENTAL_EPOCHS):
+        logger.info(f"Epoch {epoch + 1}/{INCREMENTAL_EPOCHS} for {model_type}")
+        for rows in iter_row_chunks(train_rows, rng):
+            X_chunk = X[rows]
+            y_chunk = le.transform(y[rows])
+            if epoch == 0:
+                nb_classifier.partial_fit(X_chunk, y_chunk, classes=classes)
+            logreg_classifier.partial_fit(X_chunk, y_chunk, classes=classes)
+
+    ensemble_model = assemble_voting_classifier(
+        [("nb", nb_classifier), ("logreg", logreg_classifier)], le
+    )
+    logger.info(f"Incremental model training completed successfully")
+
+    return ensemble_model
+
+
+def assemble_voting_classifier(estimators: list[tuple[str, object]], le: LabelEncoder) -> VotingClassifier:
+    """
+    Wrap estimators fitted on label-encoded targets in a fitted soft-voting VotingClassifier.
+
+    Args:
+        estimators: (name, fitted estimator) pairs, fitted on le.transform(y)
+        le: The label encoder used for the targets
+
+    Returns:
+        A VotingClassifier that predicts the original labels
+    """
+    ensemble_model = VotingClassifier(estimators=estimators, voting="soft")
+    ensemble_model.le_ = le
+    ensemble_model.classes_ = le.classes_
+    ensemble_model.estimators_ = [est for _, est in estimators]
+    ensemble_model.named_estimators_ = Bunch(**dict(estimators))
+    return ensemble_model
+
+
+def evaluate_model_in_chunks(model: VotingClassifier, X: csr_matrix, y: np.ndarray, rows: np.ndarray, model_type: str) -> None:
+    """
+    Evaluate the model on the training rows one chunk at a time.
+
+    Args:
+        model: The trained model to evaluate
+        X: Memory-mapped feature matrix holding all rows
+        y: Labels for all rows
+        rows: Row indices to evaluate on
+        model_type: Type of model being evaluated
+    """
+    logger.info(f"Evaluating {model_type} model performance")
+
+    correct = sum(int((model.predict(X[chunk]) == y[chunk]).sum()) for chunk in iter_row_chunks(rows))
+    train_accuracy = correct / len(rows)
+    logger.info(f"Training accuracy: {train_accuracy:.4f} ({train_accuracy*100:.2f}%)")
+
+
 def save_model(model: VotingClassifier, model_assets: Path, model_type: str) -> None:
     """
     Save the trained model to disk.
@@ -135,13 +505,16 @@ def evaluate_model(model: VotingClassifier, X_train: csr_matrix, y_train: np.nda
     logger.info(f"Model evaluation completed")
 
 
-def train_model(model_type: str, model_dir: str) -> None:
+def train_model(model_type: str, model_dir: str, incremental: bool = False, warm_start: bool = False) -> None:
     """
     Main function to train and evaluate a model.
 
     Args:
         model_type: Type of model to train (e.g., 'family', 'cyrillic')
         model_dir: Path to model assets directory
+        incremental: Stream row chunks from disk with partial_fit estimators instead of loading the full training matrix
+        warm_start: Initialize the logistic regressions from the saved model when the feature layout is unchanged
+            or the saved model was pruned from it
         
     Raises:
         Exception: If any step in the training process fails
@@ -152,18 +525,47 @@ def train_model(model_type: str, model_dir: str) -> None:
         # Setup paths
         model_assets = Path(model_dir)
         base = Path(__file__).resolve().parents[1]
+
+        feature_layout = current_feature_layout(model_assets, model_type)
+
+        if incremental:
+            X, y, train_rows = open_training_data(model_type, base)
+            model = create_and_fit_model_incremental(X, y, train_rows, model_type)
+            log_peak_memory(model_type)
+            model.feature_layout_ = feature_layout
+            save_model(model, model_assets, model_type)
+            evaluate_model_in_chunks(model, X, y, train_rows, model_type)
+            logger.info(f"Model training process completed successfully for {model_type}")
+            return
         
-        # Load training data
-        X_train, y_train = load_data(model_type, base)
-        
-        # Create and train model
-        model = create_and_fit_model(X_train, y_train, model_type)
-        
-        # Save model
-        save_model(model, model_assets, model_type)
-        
-        # Evaluate model
-        evaluate_model(model, X_train, y_train, model_type)
+        try:
+            # Load training data
+            X_train, y_train = load_data(model_type, base)
+
+            previous = None
+            if warm_start:
+                previous = load_previous_model(model_assets, model_type, feature_layout, np.unique(y_train), X_train.shape[1])
+
+            # Create and train model
+            start = time.perf_counter()
+            if previous is not None:
+                model = create_and_fit_model_warm(X_train, y_train, previous, model_type)
+            else:
+                model = create_and_fit_model(X_train, y_train, model_type)
+            logger.info(f"Fitting took {time.perf_counter() - start:,.1f}s")
+            log_convergence(model, model_type, previous)
+            log_peak_memory(model_type)
+
+            # Saved with the model so the next run can tell whether a warm start is possible
+            model.feature_layout_ = feature_layout
+
+            # Save model
+            save_model(model, model_assets, model_type)
+
+            # Evaluate model
+            evaluate_model(model, X_train, y_train, model_type)
+        finally:
+            shutil.rmtree(shared_data_dir(model_type, base), ignore_errors=True)
         
         logger.info(f"Model training process completed successfully for {model_type}")
         
@@ -174,15 +576,22 @@ def train_model(model_type: str, model_dir: str) -> None:
 
 def main() -> None:
     """Main entry point for command line usage."""
-    if len(sys.argv) != 3:
-        logger.error("Usage: python train_model.py <model_type> <model_dir>")
+    flags = sys.argv[3:]
+    if len(sys.argv) < 3 or not set(flags) <= {"--incremental", "--warm-start"}:
+        logger.error("Usage: python train_model.py <model_type> <model_dir> [--incremental] [--warm-start]")
         sys.exit(1)
 
     model_type = sys.argv[1]
     model_dir = sys.argv[2]
+    incremental = "--incremental" in flags
+    warm_start = "--warm-start" in flags
+
+    if incremental and warm_start:
+        logger.error("--warm-start applies to the saga logistic regressions and cannot be combined with --incremental")
+        sys.exit(1)
 
     try:
-        train_model(model_type, model_dir)
+        train_model(model_type, model_dir, incremental, warm_start)
         logger.info("Model training completed successfully")
     except Exception as e:
         logger.error(f"Model training failed: {e}")
@@ -0,0 +1,326 @@
+"""
+This model was trained using corpora provided by the Wortschatz Project
+(University of Leipzig), licensed under CC BY 4.0.
+
+Source: https://wortschatz.uni-leipzig.de/en/download
+License: https://creativecommons.org/licenses/by/4.0/
+"""
+
+import io
+import logging
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.model_selection import ParameterSampler, train_test_split
+
+from train_model import LOGREG_PARAMS, NB_PARAMS, build_ensemble_model
+from vectorize_training_data import (
+    N_JOBS,
+    RANDOM_SEED,
+    augment_vectorized_data,
+    create_vectorizer,
+    load_dataset,
+)
+from utils.ngram_features import bulk_transformer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Candidate values; keys are "<component>__<parameter>" for vectorizer, nb and logreg
+SEARCH_SPACE = {
+    "vectorizer__analyzer": ["char_wb", "char"],
+    "vectorizer__ngram_range": [(1, 3), (1, 5), (2, 5), (3, 5)],
+    "vectorizer__max_features": [30_000, 60_000, 120_000, 200_000],
+    "vectorizer__max_df": [0.95, 0.98, 1.0],
+    "nb__alpha": [0.1, 0.3, 1.0],
+    "logreg__C": [0.5, 1.0, 2.0, 4.0],
+}
+
+N_CANDIDATES = 27
+HALVING_FACTOR = 3
+MIN_BUDGET = 5_000  # training rows per candidate in the first round
+VALIDATION_SIZE = 20_000
+LATENCY_SAMPLES = 200
+
+
+def sample_candidates(n_candidates: int) -> list[dict]:
+    """
+    Draw candidate configurations from SEARCH_SPACE.
+
+    The first candidate is always the current configuration (no overrides), so every
+    table contains a baseline to compare against.
+
+    Args:
+        n_candidates: Total number of candidates, including the baseline
+
+    Returns:
+        List of override dicts keyed like SEARCH_SPACE
+    """
+    sampled = ParameterSampler(SEARCH_SPACE, n_iter=n_candidates - 1, random_state=RANDOM_SEED)
+    return [{}] + list(sampled)
+
+
+def split_overrides(candidate: dict) -> tuple[dict, dict, dict]:
+    """
+    Split a candidate into vectorizer, ComplementNB and LogisticRegression overrides.
+
+    Args:
+        candidate: Override dict keyed like SEARCH_SPACE
+
+    Returns:
+        Tuple of (vectorizer, nb, logreg) override dicts
+    """
+    groups = {"vectorizer": {}, "nb": {}, "logreg": {}}
+    for key, value in candidate.items():
+        component, parameter = key.split("__", 1)
+        groups[component][parameter] = value
+    return groups["vectorizer"], groups["nb"], groups["logreg"]
+
+
+def describe_candidate(model_type: str, candidate: dict) -> dict:
+    """
+    Resolve a candidate against the current defaults, for the results table.
+
+    Args:
+        model_type: Type of model being tuned
+        candidate: Override dict keyed like SEARCH_SPACE
+
+    Returns:
+        Dict with the effective value of every searched parameter
+    """
+    vectorizer_overrides, nb_overrides, logreg_overrides = split_overrides(candidate)
+    vectorizer_params = create_vectorizer(model_type, vectorizer_overrides).get_params()
+    nb_params = {**NB_PARAMS, **nb_overrides}
+    logreg_params = {**LOGREG_PARAMS, **logreg_overrides}
+
+    description = {}
+    for key in SEARCH_SPACE:
+        component, parameter = key.split("__", 1)
+        source = {"vectorizer": vectorizer_params, "nb": nb_params, "logreg": logreg_params}[component]
+        description[key] = source[parameter]
+    return description
+
+
+def compute_budgets(n_train: int, n_candidates: int) -> list[int]:
+    """
+    Training rows per candidate for each round of successive halving.
+
+    Args:
+        n_train: Number of rows available for training
+        n_candidates: Number of candidates in the first round
+
+    Returns:
+        Budgets, one per round, growing by HALVING_FACTOR and capped at n_train
+    """
+    n_rounds = 1 + int(math.floor(math.log(n_candidates, HALVING_FACTOR))) if n_candidates > 1 else 1
+    return [min(MIN_BUDGET * HALVING_FACTOR**r, n_train) for r in range(n_rounds)]
+
+
+def featurize(vectorizer, texts: np.ndarray, model_type: str) -> csr_matrix:
+    """
+    Turn texts into model input the same way vectorize_training_data does.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        texts: Texts to featurize
+        model_type: Type of model the features are for
+
+    Returns:
+        TF-IDF features, with the extended feature block where the tier uses one
+    """
+    X = bulk_transformer(vectorizer, texts).transform(texts)
+    return augment_vectorized_data(X, pd.DataFrame({"text": texts}), model_type, n_jobs=1)
+
+
+# Search data held by each worker, so it is sent once per process
+_worker_data: dict = {}
+
+
+def _init_search_worker(model_type: str, train_texts: np.ndarray, train_labels: np.ndarray,
+                        val_texts: np.ndarray, val_labels: np.ndarray) -> None:
+    # Per-chunk progress messages from the shared helpers would drown the search log
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_data.update(
+        model_type=model_type,
+        train_texts=train_texts,
+        train_labels=train_labels,
+        val_texts=val_texts,
+        val_labels=val_labels,
+    )
+
+
+def evaluate_candidate(task: tuple[int, dict, np.ndarray]) -> dict:
+    """
+    Fit one candidate on a subsample and measure it on the validation rows.
+
+    Args:
+        task: Tuple of (candidate id, override dict, training row indices)
+
+    Returns:
+        Dict with accuracy, training time, model size and inference latency
+    """
+    candidate_id, candidate, rows = task
+    model_type = _worker_data["model_type"]
+    texts = _worker_data["train_texts"][rows]
+    labels = _worker_data["train_labels"][rows]
+    val_texts, val_labels = _worker_data["val_texts"], _worker_data["val_labels"]
+
+    vectorizer_overrides, nb_overrides, logreg_overrides = split_overrides(candidate)
+
+    start = time.perf_counter()
+    vectorizer = create_vectorizer(model_type, vectorizer_overrides)
+    X = augment_vectorized_data(
+        vectorizer.fit_transform(texts), pd.DataFrame({"text": texts}), model_type, n_jobs=1
+    )
+    # One process per candidate, so the one-vs-rest fits stay in-process
+    model = build_ensemble_model(nb_overrides, {**logreg_overrides, "verbose": 0}, n_jobs=1)
+    model.fit(X, labels)
+    train_seconds = time.perf_counter() - start
+
+    accuracy = float((model.predict(featurize(vectorizer, val_texts, model_type)) == val_labels).mean())
+
+    buffer = io.BytesIO()
+    joblib.dump((vectorizer, model), buffer)
+
+    # The detector classifies one string at a time, so time single-text round trips
+    latencies = []
+    for text in val_texts[:LATENCY_SAMPLES]:
+        t0 = time.perf_counter()
+        model.predict_proba(featurize(vectorizer, np.array([text], dtype=object), model_type))
+        latencies.append(time.perf_counter() - t0)
+
+    return {
+        "candidate": candidate_id,
+        "budget": len(rows),
+        "accuracy": accuracy,
+        "train_seconds": train_seconds,
+        "model_mb": buffer.getbuffer().nbytes / 2**20,
+        "latency_ms_p50": float(np.median(latencies)) * 1000,
+        "n_features": X.shape[1],
+    }
+
+
+def successive_halving(model_type: str, df: pd.DataFrame, n_candidates: int = N_CANDIDATES,
+                       n_jobs: int = N_JOBS) -> pd.DataFrame:
+    """
+    Search candidate configurations with successive halving.
+
+    Every round trains all remaining candidates on the same stratified subsample,
+    keeps the best 1/HALVING_FACTOR by validation accuracy (lower latency breaks
+    ties) and multiplies the subsample size by HALVING_FACTOR for the next round.
+
+    Args:
+        model_type: Type of model to tune
+        df: Balanced dataset with "text" and "label" columns
+        n_candidates: Number of candidates in the first round
+        n_jobs: Number of candidates evaluated in parallel
+
+    Returns:
+        DataFrame with one row per (round, candidate) evaluation
+    """
+    texts = df["text"].to_numpy(dtype=object)
+    labels = df["label"].to_numpy()
+
+    val_size = min(VALIDATION_SIZE, len(df) // 5)
+    train_texts, val_texts, train_labels, val_labels = train_test_split(
+        texts, labels, test_size=val_size, stratify=labels, random_state=RANDOM_SEED
+    )
+
+    budgets = compute_budgets(len(train_texts), n_candidates)
+    # Only the largest subsample's rows are ever needed, so ship no more than that to workers
+    if budgets[-1] < len(train_texts):
+        train_texts, _, train_labels, _ = train_test_split(
+            train_texts, train_labels, train_size=budgets[-1], stratify=train_labels, random_state=RANDOM_SEED
+        )
+
+    candidates = sample_candidates(n_candidates)
+    remaining = list(range(len(candidates)))
+    results = []
+
+    logger.info(f"Searching {len(candidates)} {model_type} candidates over budgets {budgets} with {n_jobs} worker(s)")
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        initializer=_init_search_worker,
+        initargs=(model_type, train_texts, train_labels, val_texts, val_labels),
+    ) as pool:
+        for round_index, budget in enumerate(budgets):
+            all_rows = np.arange(len(train_texts))
+            if budget < len(all_rows):
+                rows, _ = train_test_split(
+                    all_rows, train_size=budget, stratify=train_labels, random_state=RANDOM_SEED + round_index
+                )
+            else:
+                rows = all_rows
+
+            logger.info(f"Round {round_index + 1}/{len(budgets)}: {len(remaining)} candidates on {len(rows):,} rows")
+            tasks = [(i, candidates[i], rows) for i in remaining]
+            round_results = list(pool.map(evaluate_candidate, tasks))
+            for result in round_results:
+                result["round"] = round_index + 1
+            results.extend(round_results)
+
+            ranked = sorted(round_results, key=lambda r: (-r["accuracy"], r["latency_ms_p50"]))
+            best = ranked[0]
+            logger.info(f"Round {round_index + 1} best: candidate {best['candidate']} with accuracy {best['accuracy']:.4f}")
+            remaining = [r["candidate"] for r in ranked[:max(1, math.ceil(len(ranked) / HALVING_FACTOR))]]
+
+    table = pd.DataFrame(results)
+    descriptions = {i: describe_candidate(model_type, candidates[i]) for i in table["candidate"].unique()}
+    described = pd.DataFrame([descriptions[i] for i in table["candidate"]])
+    table = pd.concat([table, described], axis=1)
+    columns = ["round", "candidate", "budget", "accuracy", "train_seconds", "model_mb", "latency_ms_p50", "n_features"]
+    return table[columns + list(SEARCH_SPACE)].sort_values(["round", "accuracy"], ascending=[True, False])
+
+
+def write_results(table: pd.DataFrame, results_dir: Path, model_type: str) -> None:
+    """
+    Write the search results table and log it with the winning configuration.
+
+    Args:
+        table: Results from successive_halving
+        results_dir: Directory to save results
+        model_type: Type of model that was tuned
+    """
+    results_dir.mkdir(parents=True, exist_ok=True)
+    output_file = results_dir / f"{model_type}_tuning_results.csv"
+    table.to_csv(output_file, index=False)
+    logger.info(f"Tuning results saved to {output_file}")
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        logger.info(f"Tuning results for {model_type}:\n{table.to_string(index=False, float_format=lambda v: f'{v:.4f}')}")
+
+    best = table[table["round"] == table["round"].max()].to_dict("records")[0]
+    logger.info(f"Best {model_type} configuration: " + ", ".join(f"{key}={best[key]!r}" for key in SEARCH_SPACE))
+
+
+def main() -> None:
+    """Main entry point for command line usage."""
+    if len(sys.argv) not in (3, 4):
+        logger.error("Usage: python tune_hyperparameters.py <model_type> <model_dir> [n_candidates]")
+        sys.exit(1)
+
+    model_type = sys.argv[1]
+    model_assets = Path(sys.argv[2])
+    n_candidates = int(sys.argv[3]) if len(sys.argv) == 4 else N_CANDIDATES
+    base = Path(__file__).resolve().parents[1]
+
+    try:
+        df = load_dataset(base, model_type)
+        table = successive_halving(model_type, df, n_candidates)
+        write_results(table, model_assets / "results", model_type)
+        logger.info(f"Hyperparameter search completed successfully for {model_type}")
+    except Exception as e:
+        logger.error(f"Hyperparameter search failed for {model_type}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
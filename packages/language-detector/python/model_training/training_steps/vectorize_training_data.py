@@ -6,23 +6,39 @@ Source: https://wortschatz.uni-leipzig.de/en/download
 License: https://creativecommons.org/licenses/by/4.0/
 """
 
+import hashlib
 import logging
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable
 
 import joblib
 import pandas as pd
 import numpy as np
-from scipy.sparse import hstack, csr_matrix
-from sklearn.feature_extraction.text import TfidfVectorizer
+from numbers import Integral
+from scipy.sparse import hstack, vstack, csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 
+from utils.ngram_features import VERIFY_SAMPLE_SIZE, CharNGramKeyTable, WordNGramCounter, bulk_transformer
 from utils.text_util import strip_ascii
-from utils.build_extended_features_block import build_extended_features_block
+from utils.build_extended_features_block import build_extended_features_block_chunked
+from utils.generate_or_retrieve_tell_lists import generate_or_retrieve_tell_lists
+from utils.sparse_storage import save_csr
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+RANDOM_SEED = 42
+CSV_CHUNK_SIZE = 1_000_000
+FIT_CHUNK_SIZE = 250_000
+N_JOBS = os.cpu_count() or 1
+
+# Tiers trained on TF-IDF features only, without the extended feature block
+UNAUGMENTED_MODEL_TYPES = ("family", "cyrillic")
+
 VECTORIZER_CONFIGURATION = {
         "southern_slavic": dict(
             max_features=200_000, max_df=0.995, ngram_range=(3, 5), analyzer="char"
@@ -33,47 +49,88 @@ VECTORIZER_CONFIGURATION = {
         "perso_arabic": dict(max_features=80_000, max_df=0.98),
     }
 
-def load_dataset(base: Path, model_type: str) -> pd.DataFrame:
+def load_dataset(base: Path, model_type: str, subset: np.ndarray | None = None) -> pd.DataFrame:
     """
-    Load dataset for a specific model type.
+    Load the balanced dataset for a specific model type.
+
+    Streams ld_{model_type}_data.csv, keeps only the rows named in the balanced index
+    written by prepare_datasets, then expands repeats and shuffles. Repeated rows share
+    the same string objects, so up-sampling does not copy text.
     
     Args:
         base: Base directory for the dataset
         model_type: Type of model to load data for (e.g., 'family', 'cyrillic')
+        subset: If given, only these rows of the shuffled dataset (e.g. a split's rows of the vectorized matrix)
 
     Returns:
         DataFrame containing the dataset
 
     Raises:
-        FileNotFoundError: If dataset file is not found
+        FileNotFoundError: If dataset or index file is not found
         pd.errors.EmptyDataError: If dataset file is empty
     """
+    data_dir = base / "data" / "intermediate"
+    file_path = data_dir / f"ld_{model_type}_data.csv"
+    index_path = data_dir / f"ld_balanced_{model_type}_index.npz"
+
     try:
-        file_path = base / "data" / "intermediate" / f"ld_balanced_{model_type}_data.csv"
+        logger.info(f"Loading balanced index from {index_path}")
+        with np.load(index_path) as index:
+            rows, counts = index["rows"], index["counts"]
+
+        rng = np.random.default_rng(RANDOM_SEED)
+        order = rng.permutation(np.repeat(np.arange(len(rows)), counts))
+        if subset is not None:
+            # Only keep the strings the subset refers to
+            order = order[subset]
+            needed = np.unique(order)
+            rows, order = rows[needed], np.searchsorted(needed, order)
+
         logger.info(f"Loading dataset from {file_path}")
-        df = pd.read_csv(file_path, usecols=["text", "label"])
+        texts, labels = [], []
+        offset = 0
+
+        for chunk in pd.read_csv(
+            file_path,
+            usecols=["text", "label"],
+            dtype=object,
+            chunksize=CSV_CHUNK_SIZE,
+        ):
+            lo, hi = np.searchsorted(rows, [offset, offset + len(chunk)])
+            selected = rows[lo:hi] - offset
+            texts.append(chunk["text"].to_numpy()[selected])
+            labels.append(chunk["label"].to_numpy()[selected])
+            offset += len(chunk)
+
+        df = pd.DataFrame(
+            {
+                "text": np.concatenate(texts)[order],
+                "label": np.concatenate(labels)[order],
+            }
+        )
         logger.info(f"Loaded {len(df)} rows for {model_type}")
         return df
-    except FileNotFoundError:
-        logger.error(f"Dataset file not found: {base / 'data' / 'intermediate' / f'ld_balanced_{model_type}_data.csv'}")
+    except FileNotFoundError as e:
+        logger.error(f"Dataset file not found: {e.filename}")
         raise
     except pd.errors.EmptyDataError:
-        logger.error(f"Dataset file is empty: ld_balanced_{model_type}_data.csv")
+        logger.error(f"Dataset file is empty: ld_{model_type}_data.csv")
         raise
 
 
-def create_vectorizer(model_type: str) -> TfidfVectorizer:
+def create_vectorizer(model_type: str, overrides: dict | None = None) -> TfidfVectorizer:
     """
     Create a TfidfVectorizer for a specific model type.
     
     Args:
         model_type: Type of model to create vectorizer for (e.g., 'family', 'cyrillic')
+        overrides: Settings that take precedence over VECTORIZER_CONFIGURATION (analyzer, ngram_range, max_features, max_df)
 
     Returns:
         TfidfVectorizer configured for the model type
     """
 
-    config = VECTORIZER_CONFIGURATION.get(model_type, {})
+    config = {**VECTORIZER_CONFIGURATION.get(model_type, {}), **(overrides or {})}
 
     logger.info(f"Configuring {model_type} vectorizer with custom settings")
     vectorizer = TfidfVectorizer(
@@ -89,39 +146,202 @@ def create_vectorizer(model_type: str) -> TfidfVectorizer:
 
     return vectorizer
 
-def vectorize_dataset(df: pd.DataFrame, vectorizer: TfidfVectorizer) -> tuple[csr_matrix, np.ndarray]:
+def vectorize_dataset(df: pd.DataFrame, vectorizer: TfidfVectorizer, chunk_size: int | None = FIT_CHUNK_SIZE, n_jobs: int = N_JOBS) -> tuple[csr_matrix, np.ndarray]:
     """
     Vectorize dataset using TfidfVectorizer.
     
     Args:
         df: DataFrame containing the dataset
         vectorizer: TfidfVectorizer to use for vectorization
+        chunk_size: Rows per chunk for the two-pass chunked fit, or None to fit all rows at once
+        n_jobs: Number of worker processes for the chunked transform pass
 
     Returns:
         Tuple containing the vectorized data and labels
     """
     logger.info(f"Vectorizing {len(df)} text samples")
-    X = vectorizer.fit_transform(df["text"])
+    if chunk_size is None:
+        X = vectorizer.fit_transform(df["text"])
+    else:
+        fit_vectorizer_in_chunks(vectorizer, df["text"], chunk_size)
+        X = transform_in_chunks(vectorizer, df["text"], chunk_size, n_jobs)
     y = df["label"].values
 
     logger.info(f"Vectorization complete: {X.shape[0]} samples, {X.shape[1]} features")
     return X, y
 
 
-def augment_vectorized_data(X_base: np.ndarray, df: pd.DataFrame, model_type: str) -> np.ndarray:
+def fit_vectorizer_in_chunks(vectorizer: TfidfVectorizer, texts: pd.Series, chunk_size: int) -> TfidfVectorizer:
+    """
+    Fit a TfidfVectorizer by streaming document and term frequencies over chunks.
+
+    Only per-term totals are kept between chunks, so the full n-gram count matrix is
+    never built. Vocabulary pruning (min_df, max_df, max_features) and IDF weights
+    follow the same rules as TfidfVectorizer.fit.
+
+    Args:
+        vectorizer: Unfitted TfidfVectorizer from create_vectorizer
+        texts: Text column to fit on
+        chunk_size: Number of rows analyzed per chunk
+
+    Returns:
+        The fitted vectorizer
+
+    Raises:
+        ValueError: If the document frequency limits leave no terms
+    """
+    counter = CountVectorizer(analyzer=vectorizer.build_analyzer(), dtype=np.int64)
+    term_index: dict[str, int] = {}
+    doc_freqs = np.zeros(0, dtype=np.int64)
+    term_freqs = np.zeros(0, dtype=np.int64)
+
+    for start in range(0, len(texts), chunk_size):
+        X_counts = counter.fit_transform(texts[start:start + chunk_size])
+        logger.info(f"Counted n-grams for rows {start:,} - {start + X_counts.shape[0]:,}")
+
+        chunk_terms = sorted(counter.vocabulary_, key=counter.vocabulary_.get)
+        columns = np.fromiter(
+            (term_index.setdefault(t, len(term_index)) for t in chunk_terms),
+            dtype=np.int64,
+            count=len(chunk_terms),
+        )
+        doc_freqs = np.pad(doc_freqs, (0, len(term_index) - len(doc_freqs)))
+        term_freqs = np.pad(term_freqs, (0, len(term_index) - len(term_freqs)))
+
+        doc_freqs[columns] += np.bincount(X_counts.indices, minlength=len(columns))
+        term_freqs[columns] += np.asarray(X_counts.sum(axis=0)).ravel()
+
+    # Mirror CountVectorizer.fit_transform: sort terms, then apply df and max_features limits
+    terms = sorted(term_index)
+    order = np.fromiter((term_index[t] for t in terms), dtype=np.int64, count=len(terms))
+    doc_freqs, term_freqs = doc_freqs[order], term_freqs[order]
+
+    n_doc = len(texts)
+    max_df, min_df = vectorizer.max_df, vectorizer.min_df
+    max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_doc
+    min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_doc
+    if max_doc_count < min_doc_count:
+        raise ValueError("max_df corresponds to < documents than min_df")
+
+    mask = (doc_freqs <= max_doc_count) & (doc_freqs >= min_doc_count)
+    limit = vectorizer.max_features
+    if limit is not None and mask.sum() > limit:
+        tfs = term_freqs.astype(vectorizer.dtype)
+        mask_inds = (-tfs[mask]).argsort()[:limit]
+        new_mask = np.zeros(len(mask), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+
+    kept = np.where(mask)[0]
+    if len(kept) == 0:
+        raise ValueError(
+            "After pruning, no terms remain. Try a lower min_df or a higher max_df."
+        )
+
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.vocabulary_ = {terms[i]: j for j, i in enumerate(kept)}
+
+    # Same smoothed IDF as TfidfTransformer.fit, in the vectorizer's dtype
+    df = doc_freqs[kept].astype(vectorizer.dtype) + float(vectorizer.smooth_idf)
+    idf = np.full_like(df, fill_value=n_doc + int(vectorizer.smooth_idf))
+    idf /= df
+    np.log(idf, out=idf)
+    idf += 1.0
+    vectorizer.idf_ = idf
+    vectorizer._tfidf.n_features_in_ = len(kept)
+
+    logger.info(f"Chunked fit complete: {len(term_index):,} candidate n-grams, {len(kept):,} kept")
+    return vectorizer
+
+
+def transform_in_chunks(vectorizer: TfidfVectorizer, texts: pd.Series, chunk_size: int, n_jobs: int = N_JOBS) -> csr_matrix:
+    """
+    Transform texts chunk by chunk with a fitted vectorizer and stack the CSR pieces.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        texts: Text column to transform
+        chunk_size: Number of rows transformed per chunk
+        n_jobs: Number of worker processes; 1 transforms in the current process
+
+    Returns:
+        CSR matrix with one row per text
+    """
+    logger.info(f"Transforming {len(texts):,} rows across {n_jobs} worker(s)")
+    pieces = map_text_shards(
+        _transform_shard,
+        texts,
+        chunk_size,
+        n_jobs,
+        initializer=_init_transform_worker,
+        initargs=(vectorizer, texts.to_numpy()[:VERIFY_SAMPLE_SIZE]),
+    )
+    return vstack(pieces, format="csr")
+
+
+def map_text_shards(func: Callable, texts: pd.Series, chunk_size: int, n_jobs: int, initializer: Callable | None = None, initargs: tuple = ()) -> list:
+    """
+    Apply a function to consecutive shards of a text column, optionally in a process pool.
+
+    Args:
+        func: Function taking an array of texts and returning a result for that shard
+        texts: Text column to shard
+        chunk_size: Number of rows per shard
+        n_jobs: Number of worker processes; 1 runs in the current process
+        initializer: Optional per-worker setup, also run in-process when n_jobs is 1
+        initargs: Arguments for the initializer
+
+    Returns:
+        List of per-shard results in input order
+    """
+    values = np.asarray(texts, dtype=object)
+    shards = (values[start:start + chunk_size] for start in range(0, len(values), chunk_size))
+
+    if n_jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(shard) for shard in shards]
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer, initargs=initargs) as pool:
+        return list(pool.map(func, shards))
+
+
+# Fitted vectorizer held by each transform worker, so it is sent once per process
+_worker_vectorizer: TfidfVectorizer | CharNGramKeyTable | WordNGramCounter | None = None
+
+
+def _init_transform_worker(vectorizer: TfidfVectorizer, sample_texts: np.ndarray) -> None:
+    global _worker_vectorizer
+    # Same counts as the vectorizer's own analyzer, without a Python loop per character
+    _worker_vectorizer = bulk_transformer(vectorizer, sample_texts)
+
+
+def _transform_shard(texts: np.ndarray) -> csr_matrix:
+    X = _worker_vectorizer.transform(texts)
+    if isinstance(_worker_vectorizer, WordNGramCounter):
+        logger.info(f"N-gram word cache: {_worker_vectorizer.cache.describe()}")
+    return X
+
+
+def augment_vectorized_data(X_base: np.ndarray, df: pd.DataFrame, model_type: str, chunk_size: int = FIT_CHUNK_SIZE, n_jobs: int = N_JOBS) -> np.ndarray:
     """
     Augment vectorized data with extra features.
     
     Args:
         X_base: Base vectorized data
         df: DataFrame containing the dataset
+        model_type: Type of model to build extended features for
+        chunk_size: Number of rows per extended-feature shard
+        n_jobs: Number of worker processes building shards
 
     Returns:
         Augmented vectorized data or base vectorized data if no augmentation is needed
     """
-    if model_type not in ["family", "cyrillic"]:
+    if model_type not in UNAUGMENTED_MODEL_TYPES:
         logger.info(f"Augmenting vectorized {model_type} data with extra features")
-        extended_feature_block = build_extended_features_block(df["text"], model_type)
+        extended_feature_block = build_extended_features_block_chunked(
+            df["text"], model_type, chunk_size, n_jobs
+        )
 
         if extended_feature_block.dtype != X_base.dtype:
             extended_feature_block = extended_feature_block.astype(
@@ -139,6 +359,29 @@ def augment_vectorized_data(X_base: np.ndarray, df: pd.DataFrame, model_type: st
         return X_base
 
 
+def feature_layout_fingerprint(vectorizer: TfidfVectorizer, model_type: str) -> str:
+    """
+    Fingerprint the column layout of the vectorized data.
+
+    Two runs with the same fingerprint produce matrices whose columns mean the same
+    thing: the same vocabulary in the same order, followed by the same extended
+    feature block. IDF weights are not included, since they do not move columns.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        model_type: Type of model the features are for
+
+    Returns:
+        Hex digest identifying the feature layout
+    """
+    digest = hashlib.sha256()
+    for term in sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get):
+        digest.update(term.encode("utf-8") + b"\0")
+    if model_type not in UNAUGMENTED_MODEL_TYPES:
+        digest.update(repr(generate_or_retrieve_tell_lists(model_type)).encode("utf-8"))
+    return digest.hexdigest()
+
+
 def write_vectorizer_and_data(vectorizer: TfidfVectorizer, X_aug: np.ndarray, y: np.ndarray, base: Path, model_assets: Path, model_type: str) -> None:
     """
     Write vectorizer and data to disk.
@@ -157,11 +400,10 @@ def write_vectorizer_and_data(vectorizer: TfidfVectorizer, X_aug: np.ndarray, y:
     logger.info("Vectorizer write complete")
 
     logger.info(f"Writing vectorized {model_type} data to disk")
-    joblib.dump(
-        (X_aug, y),
-        base
-        / Path("data/processed/vectorized")
-        / f"ld_vectorized_{model_type}_data.joblib",
+    save_csr(
+        base / Path("data/processed/vectorized") / f"ld_vectorized_{model_type}_data",
+        X_aug,
+        y,
     )
     logger.info("Vectorized data write complete")
 
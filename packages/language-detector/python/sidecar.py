@@ -0,0 +1,183 @@
+"""
+Long-lived sidecar answering language detection and Thai romanization requests.
+
+Usage:
+    python sidecar.py
+
+Each stdin line is a JSON request {"id": ..., "method": ..., "params": {...}} and each
+stdout line is the matching reply {"id": ..., "result": ..., "elapsed_ms": ...} or
+{"id": ..., "error": ..., "elapsed_ms": ...}, written in request order. Methods:
+
+    detect       {"text": str} or {"texts": [str, ...]}; language codes
+    romanize_th  {"text": <segmented string>} or {"texts": [...]}; romanizations
+    stats        no params; request counts and latency percentiles per method
+
+Detector tiers and the Thai engine are loaded by the first request that needs them
+and kept for the life of the process, so callers pay one interpreter start instead of
+one per call and per engine. THAI_ROMANIZATION_SCRIPT overrides the location of
+python-thai-romanization.py, which defaults to the thai-engine package next to this one.
+"""
+
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable
+
+# Constants
+HERE = Path(__file__).resolve().parent
+THAI_SCRIPT_ENV = "THAI_ROMANIZATION_SCRIPT"
+THAI_SCRIPT = HERE.parents[1] / "thai-engine" / "python" / "python-thai-romanization.py"
+LATENCY_WINDOW = 1_000  # most recent requests per method used for the percentiles
+
+
+@lru_cache(maxsize=None)
+def thai_romanizer() -> ModuleType:
+    """
+    Import python-thai-romanization.py, whose file name is not a valid module name.
+
+    Returns:
+        The loaded module
+
+    Raises:
+        FileNotFoundError: If the script is not found
+    """
+    path = Path(os.environ.get(THAI_SCRIPT_ENV, THAI_SCRIPT))
+    if not path.exists():
+        raise FileNotFoundError(f"Thai romanization script not found: {path}")
+
+    spec = importlib.util.spec_from_file_location("python_thai_romanization", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def detect(params: dict) -> str | list[str]:
+    # Imported on first use, so a sidecar that only romanizes never loads NumPy or scikit-learn
+    from language_detector import detect_language
+
+    if "texts" in params:
+        return [detect_language(text) for text in params["texts"]]
+    return detect_language(params["text"])
+
+
+def romanize_th(params: dict) -> str | list[str]:
+    romanizer = thai_romanizer()
+    if "texts" in params:
+        return romanizer.romanize_batch(params["texts"])
+    return romanizer.romanize_thai_tokens(params["text"])
+
+
+class LatencyStats:
+    """Request count, error count and recent latencies of one method."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        """
+        Args:
+            window: Number of most recent latencies kept for the percentiles
+        """
+        self.requests = 0
+        self.errors = 0
+        self._latencies_ms: deque[float] = deque(maxlen=window)
+
+    def record(self, elapsed_ms: float, failed: bool) -> None:
+        self.requests += 1
+        self.errors += failed
+        self._latencies_ms.append(elapsed_ms)
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            Dict with the request and error counts and the mean, p50, p95 and max
+            latency in milliseconds over the most recent requests
+        """
+        latencies = sorted(self._latencies_ms)
+        if not latencies:
+            return {"requests": 0, "errors": 0}
+
+        def percentile(q: float) -> float:
+            # Nearest rank: the smallest latency at least q of the requests did not exceed
+            return round(latencies[max(0, math.ceil(q * len(latencies)) - 1)], 3)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(latencies[-1], 3),
+        }
+
+
+class Sidecar:
+    """Routes typed requests to their handlers and records each method's latency."""
+
+    def __init__(self):
+        self.methods: dict[str, Callable[[dict], Any]] = {
+            "detect": detect,
+            "romanize_th": romanize_th,
+            "stats": lambda params: self.stats(),
+        }
+        self.latencies = {method: LatencyStats() for method in self.methods}
+
+    def stats(self) -> dict:
+        return {method: stats.summary() for method, stats in self.latencies.items()}
+
+    def handle_request(self, line: str) -> dict:
+        """
+        Answer one JSON-lines request.
+
+        Args:
+            line: The request
+
+        Returns:
+            The reply; failures become an error reply instead of ending the sidecar
+        """
+        start = time.perf_counter()
+        request_id, method = None, None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = request.get("method")
+            if method not in self.methods:
+                raise ValueError(f"Unknown method {method!r}, expected one of {sorted(self.methods)}")
+            reply = {"id": request_id, "result": self.methods[method](request.get("params") or {})}
+        except Exception as e:
+            reply = {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        reply["elapsed_ms"] = round(elapsed_ms, 3)
+        if method in self.latencies:
+            self.latencies[method].record(elapsed_ms, failed="error" in reply)
+        return reply
+
+    def serve(self, stdin=sys.stdin, stdout=sys.stdout) -> None:
+        """Answer requests until stdin closes, flushing each reply so the caller never waits on a buffer."""
+        # Pipes default to the locale encoding on some platforms; requests are always UTF-8
+        for stream in (stdin, stdout):
+            if hasattr(stream, "reconfigure"):
+                stream.reconfigure(encoding="utf-8")
+
+        for line in stdin:
+            if not line.strip():
+                continue
+            stdout.write(json.dumps(self.handle_request(line), ensure_ascii=False) + "\n")
+            stdout.flush()
+
+
+def main() -> None:
+    """Main entry point for command line usage."""
+    if len(sys.argv) != 1:
+        raise ValueError("Usage: python sidecar.py")
+
+    Sidecar().serve()
+
+
+if __name__ == "__main__":
+    main()
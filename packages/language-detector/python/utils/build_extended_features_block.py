@@ -2,10 +2,13 @@ import logging
 import os
 import regex
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
 
 import numpy as np
 from numpy.typing import NDArray
-from scipy.sparse import csr_matrix, hstack
+from scipy.sparse import csr_matrix, hstack, vstack
 from typing import TypeAlias
 
 from utils.generate_or_retrieve_tell_lists import (
@@ -14,6 +17,7 @@ from utils.generate_or_retrieve_tell_lists import (
     Radical_List_Return,
     TellLists,
 )
+from utils.word_cache import WordCache
 
 # Configure logging based on environment variable
 if not os.environ.get('DISABLE_LOGGING'):
@@ -37,6 +41,11 @@ FeatureArrayReturn: TypeAlias = (
 NON_UNIQUE_KEYS = ["overlapping", "radicals"]
 PUNCT_OR_SYMBOL = regex.compile(r"[\p{P}\p{S}]+")
 MULTISPACE = regex.compile(r"\s+")
+CHUNK_SIZE = 100_000
+
+# Per-process caches of each word's ending hits, keyed by ending layout, so repeated
+# feature builds (one per chunk, or one per request in a long-lived process) share them
+ENDING_CACHES: dict[tuple, WordCache] = {}
 
 
 def build_extended_features_block(texts: list[str], model_type: str) -> csr_matrix:
@@ -80,6 +89,66 @@ def build_extended_features_block(texts: list[str], model_type: str) -> csr_matr
     return hstack(extended_feature_matrices, format="csr")
 
 
+def build_extended_features_block_chunked(
+    texts: Iterable[str], model_type: str, chunk_size: int = CHUNK_SIZE, n_jobs: int = 1
+) -> csr_matrix:
+    """
+    Build the extended features block in row chunks and stack the results.
+
+    Produces the same matrix as build_extended_features_block, but dense per-row
+    arrays only ever exist for one chunk per worker.
+
+    Args:
+        texts: The texts to build the extended features block for
+        model_type: The type of model to build the extended features block for
+        chunk_size: The number of rows per chunk
+        n_jobs: The number of worker processes; 1 builds chunks in the current process
+
+    Returns:
+        A csr_matrix containing the extended features block
+    """
+    return vstack(
+        list(iter_extended_features_blocks(texts, model_type, chunk_size, n_jobs)),
+        format="csr",
+    )
+
+
+def iter_extended_features_blocks(
+    texts: Iterable[str], model_type: str, chunk_size: int = CHUNK_SIZE, n_jobs: int = 1
+) -> Iterator[csr_matrix]:
+    """
+    Yield extended features blocks for consecutive row chunks, in input order.
+
+    With n_jobs > 1 chunks are built in a process pool, with at most two chunks per
+    worker in flight so pending inputs and results stay bounded.
+
+    Args:
+        texts: The texts to build the extended features blocks for
+        model_type: The type of model to build the extended features blocks for
+        chunk_size: The number of rows per chunk
+        n_jobs: The number of worker processes; 1 builds chunks in the current process
+
+    Yields:
+        A csr_matrix for each chunk, all with the same column layout
+    """
+    values = np.asarray(list(texts), dtype=object)
+    chunks = (values[start:start + chunk_size] for start in range(0, len(values), chunk_size))
+
+    if n_jobs == 1:
+        for chunk in chunks:
+            yield build_extended_features_block(chunk, model_type)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(build_extended_features_block, chunk, model_type))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 # --- Helper to scale & safely convert arrays ---
 def prepare_feature_block(feature_array: NDArray[np.float32] | None, scale: float, num_samples: int) -> csr_matrix:
     """
@@ -275,51 +344,64 @@ def build_ending_features_array(
     if group_endings is None:
         return None, None
 
-    end_to_idx = {end: j for j, end in enumerate(endings)}
+    groups = [gr for gr in ending_groups if gr not in NON_UNIQUE_KEYS]
+    group_ending_lists = tuple(tuple(group_endings[gr]) for gr in groups)
+    cache = ENDING_CACHES.setdefault((tuple(endings), group_ending_lists), WordCache())
 
     end_len = len(endings)
     txt_len = len(texts)
 
-    endings_features = np.zeros((txt_len, end_len * 2), dtype=np.float32)
+    hit_columns = []
+    row_lengths = np.zeros(txt_len, dtype=np.int64)
     per_group_totals = []
 
     for row, s in enumerate(texts):
         s = unicodedata.normalize("NFC", s)
         cleaned = MULTISPACE.sub(" ", PUNCT_OR_SYMBOL.sub(" ", s)).strip()
-        words = cleaned.split()
-
-        for end in endings:
-
-            count = 0.0
 
-            for w in words:
-                if w.endswith(end):
-                    count += 1.0
-
-            if count > 0:
-                present_col = end_to_idx[end]
-                count_col = present_col + end_len
+        start = len(hit_columns)
+        group_totals = [0.0] * len(groups)
+        for w in cleaned.split():
+            hits = cache.get(w)
+            if hits is None:
+                hits = word_ending_hits(w, endings, group_ending_lists)
+                cache.put(w, hits)
+            columns, word_groups = hits
+            hit_columns.extend(columns)
+            for k in word_groups:
+                group_totals[k] += 1.0
+
+        row_lengths[row] = len(hit_columns) - start
+        per_group_totals.append(dict(zip(groups, group_totals)))
+
+    # Count columns hold the number of words with each ending, present columns flag them
+    endings_features = np.zeros((txt_len, end_len * 2), dtype=np.float32)
+    rows = np.repeat(np.arange(txt_len), row_lengths)
+    np.add.at(endings_features, (rows, np.asarray(hit_columns, dtype=np.intp) + end_len), 1.0)
+    endings_features[:, :end_len] = endings_features[:, end_len:] > 0
 
-                endings_features[row, present_col] = 1.0
-                endings_features[row, count_col] = float(count)
+    logger.info(f"Ending word cache: {cache.describe()}")
+    return endings_features, per_group_totals
 
-        row_group_totals = {
-            gr: 0.0 for gr in ending_groups if gr not in NON_UNIQUE_KEYS
-        }
-        for group in ending_groups:
-            if group in NON_UNIQUE_KEYS:
-                continue
 
-            total = 0.0
-            for e in group_endings[group]:
+def word_ending_hits(
+    word: str, endings: tuple[str, ...], group_ending_lists: tuple[tuple[str, ...], ...]
+) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """
+    Find which endings a single word has.
 
-                for w in words:
-                    if w.endswith(e):
-                        total += 1
-            row_group_totals[group] = float(total)
-        per_group_totals.append(row_group_totals)
+    Args:
+        word: The word to check
+        endings: All endings, in feature column order
+        group_ending_lists: The endings of each group counted towards the group totals
 
-    return endings_features, per_group_totals
+    Returns:
+        A tuple containing the column indices of the word's endings and the group index
+        of every group ending it has, repeated per matching ending
+    """
+    columns = tuple(j for j, end in enumerate(endings) if word.endswith(end))
+    word_groups = tuple(k for k, group in enumerate(group_ending_lists) for e in group if word.endswith(e))
+    return columns, word_groups
 
 
 def build_bigram_features_array(
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import TypeAlias, TypedDict
 from pathlib import Path
 import joblib
@@ -25,10 +26,14 @@ class TellLists(TypedDict):
     bigram_lists: Generate_List_Return
 
 
+@lru_cache(maxsize=None)
 def generate_or_retrieve_tell_lists(model_type: str) -> TellLists:
     """
     Generate or retrieve tell lists for a given model type.
 
+    Results are cached per process, so repeated feature builds (e.g. one per chunk)
+    only read the tell lists file once.
+
     Args:
         model_type: Type of model to generate tell lists for
 
@@ -0,0 +1,67 @@
+import os
+import sys
+from types import BuiltinFunctionType, FunctionType, ModuleType
+from typing import Optional
+
+import numpy as np
+
+# Shared by every object that refers to them, so they are never counted towards one
+SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, np.dtype)
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Resident memory of this process in bytes, or None if it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def deep_size(obj: object) -> int:
+    """
+    Approximate number of bytes held by an object and everything it references.
+
+    Each object is counted once however often it is referenced. NumPy arrays count
+    their data buffer once, through whichever array owns it, so views cost only
+    their header; SciPy sparse matrices are counted through their component arrays.
+
+    Args:
+        obj: Object to measure
+
+    Returns:
+        Size in bytes
+    """
+    seen: set[int] = set()
+    stack = [obj]
+    total = 0
+
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, np.ndarray):
+            if current.base is not None:
+                stack.append(current.base)
+            if current.dtype == object:
+                stack.extend(current.flat)
+        elif isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif not isinstance(current, (str, bytes, bytearray, int, float, complex, bool)):
+            if hasattr(current, "__dict__"):
+                stack.append(vars(current))
+            for cls in type(current).__mro__:
+                slots = cls.__dict__.get("__slots__", ())
+                for slot in (slots,) if isinstance(slots, str) else slots:
+                    if slot != "__dict__" and hasattr(current, slot):
+                        stack.append(getattr(current, slot))
+
+    return total
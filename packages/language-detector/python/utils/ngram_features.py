@@ -0,0 +1,460 @@
+import warnings
+from collections import Counter
+from typing import Iterable, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.utils.sparsefuncs_fast import inplace_csr_row_normalize_l1, inplace_csr_row_normalize_l2
+
+from utils.text_util import build_whitespace_table, encode_codepoints
+from utils.word_cache import WORD_CACHE_SIZE, WordCache
+
+# Vectorizer parameters that decide which n-grams are extracted and how they are counted.
+# Tiers agreeing on all of them can share one analysis of the same input.
+ANALYSIS_PARAMS = (
+    "input",
+    "encoding",
+    "decode_error",
+    "strip_accents",
+    "lowercase",
+    "preprocessor",
+    "tokenizer",
+    "analyzer",
+    "stop_words",
+    "token_pattern",
+    "ngram_range",
+    "binary",
+)
+
+KEY_BATCH_SIZE = 10_000  # documents analyzed together; bounds the per-window key arrays
+VERIFY_SAMPLE_SIZE = 1_000  # texts bulk_transformer checks against vectorizer.transform
+VERIFY_TOLERANCE = 1e-6
+
+
+def analysis_key(vectorizer: TfidfVectorizer) -> tuple:
+    """
+    Identify how a vectorizer turns text into n-grams.
+
+    Args:
+        vectorizer: A TfidfVectorizer
+
+    Returns:
+        A hashable key; vectorizers with equal keys produce identical n-gram counts
+    """
+    return tuple(repr(getattr(vectorizer, name)) for name in ANALYSIS_PARAMS)
+
+
+def counts_to_tfidf(vectorizer: TfidfVectorizer, counts: Counter) -> csr_matrix:
+    """
+    Build a single TF-IDF row from n-gram counts, exactly as vectorizer.transform would.
+
+    Only n-grams in the vectorizer's vocabulary are kept. The count row then goes
+    through the same steps as TfidfTransformer.transform (sublinear tf, IDF weighting,
+    sklearn's in-place row normalization), minus the input validation that dominates
+    the cost of transforming a single row.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        counts: N-gram counts produced by the vectorizer's analyzer
+
+    Returns:
+        A 1 x n_features csr_matrix
+    """
+    vocabulary = vectorizer.vocabulary_
+    found = sorted((vocabulary[term], count) for term, count in counts.items() if term in vocabulary)
+    columns = np.fromiter((column for column, _ in found), dtype=np.int32, count=len(found))
+    values = np.fromiter((count for _, count in found), dtype=vectorizer.dtype, count=len(found))
+    if vectorizer.binary:
+        values[:] = 1
+
+    X = csr_matrix(
+        (values, columns, np.array([0, len(found)], dtype=np.int32)),
+        shape=(1, len(vocabulary)),
+        dtype=vectorizer.dtype,
+    )
+
+    if vectorizer.norm not in (None, "l1", "l2"):
+        return vectorizer._tfidf.transform(X, copy=False)
+
+    if vectorizer.sublinear_tf:
+        np.log(X.data, X.data)
+        X.data += 1.0
+    if vectorizer.use_idf:
+        X.data *= vectorizer.idf_[X.indices]
+    if vectorizer.norm == "l2":
+        inplace_csr_row_normalize_l2(X)
+    elif vectorizer.norm == "l1":
+        inplace_csr_row_normalize_l1(X)
+    return X
+
+
+class SharedNGrams:
+    """
+    N-gram counts for one input, computed once per distinct analyzer configuration.
+
+    Every tier in the detection cascade vectorizes the same string. Tiers whose
+    vectorizers analyze text the same way reuse one Counter, and each only maps it
+    onto its own vocabulary, IDF weights and normalization.
+    """
+
+    def __init__(self, string: str):
+        """
+        Args:
+            string: The input being classified
+        """
+        self.string = string
+        self._counts: dict[tuple, Counter] = {}
+
+    def counts(self, vectorizer: TfidfVectorizer) -> Counter:
+        """
+        Args:
+            vectorizer: A fitted TfidfVectorizer
+
+        Returns:
+            Counts of every n-gram the vectorizer's analyzer extracts from the input
+        """
+        key = analysis_key(vectorizer)
+        if key not in self._counts:
+            self._counts[key] = Counter(vectorizer.build_analyzer()(self.string))
+        return self._counts[key]
+
+    def transform(self, vectorizer: TfidfVectorizer) -> csr_matrix:
+        """
+        Equivalent to vectorizer.transform([string]).
+
+        Args:
+            vectorizer: A fitted TfidfVectorizer
+
+        Returns:
+            A 1 x n_features csr_matrix
+        """
+        return counts_to_tfidf(vectorizer, self.counts(vectorizer))
+
+
+class CharNGramKeyTable:
+    """
+    Vectorized replacement for sklearn's "char" and "char_wb" analyzers, limited to a fitted vocabulary.
+
+    The vocabulary is stored as a trie with one sorted key array per n-gram length.
+    The key of an n-character prefix is the id of its first n - 1 characters times
+    the alphabet size plus the code of its last character, so all windows of a
+    batch extend by one character per NumPy pass and windows whose prefix is not
+    in the vocabulary drop out early. Counts are identical to the vectorizer's own.
+    """
+
+    def __init__(self, vectorizer: TfidfVectorizer):
+        """
+        Args:
+            vectorizer: Fitted TfidfVectorizer accepted by supports()
+
+        Raises:
+            ValueError: If the vectorizer's analyzer is not supported
+        """
+        if not self.supports(vectorizer):
+            raise ValueError(f"Unsupported analyzer {vectorizer.analyzer!r}, expected 'char' or 'char_wb' on text input")
+
+        self.vectorizer = vectorizer
+        self.word_boundaries = vectorizer.analyzer == "char_wb"
+        self.min_n, self.max_n = vectorizer.ngram_range
+        self.preprocess = vectorizer.build_preprocessor()
+
+        # Code 0 marks characters that appear in no vocabulary term
+        self.alphabet = np.array(sorted(set("".join(vectorizer.vocabulary_)) | {" "}), dtype="U1").view(np.uint32)
+        self.radix = len(self.alphabet) + 1
+        codes = {chr(codepoint): code for code, codepoint in enumerate(self.alphabet.tolist(), start=1)}
+        self.level_keys, self.level_columns = [], []
+        prefix_ids = {"": 0}
+        for n in range(1, self.max_n + 1):
+            prefixes = {term[:n] for term in vectorizer.vocabulary_ if len(term) >= n}
+            keyed = sorted((prefix_ids[prefix[:-1]] * self.radix + codes[prefix[-1]], prefix) for prefix in prefixes)
+            self.level_keys.append(np.array([key for key, _ in keyed], dtype=np.int64))
+            self.level_columns.append(np.array([vectorizer.vocabulary_.get(prefix, -1) for _, prefix in keyed], dtype=np.int64))
+            prefix_ids = {prefix: i for i, (_, prefix) in enumerate(keyed)}
+        self.space_code = codes[" "]
+
+    @staticmethod
+    def supports(vectorizer: TfidfVectorizer) -> bool:
+        """
+        Check whether a fitted vectorizer can be handled by a key table.
+
+        Args:
+            vectorizer: Fitted TfidfVectorizer
+
+        Returns:
+            True for char and char_wb analyzers on text input
+        """
+        return vectorizer.analyzer in ("char", "char_wb") and vectorizer.input == "content"
+
+    def encode(self, codepoints: NDArray[np.uint32]) -> NDArray[np.int64]:
+        """Map codepoints to character codes, with 0 for characters outside the alphabet."""
+        index = np.minimum(np.searchsorted(self.alphabet, codepoints), len(self.alphabet) - 1)
+        return np.where(self.alphabet[index] == codepoints, index + 1, 0)
+
+    def count_matrix(self, texts: Iterable, preprocessed: bool = False) -> csr_matrix:
+        """
+        Count vocabulary n-grams per text, like CountVectorizer.transform with the fitted vocabulary.
+
+        Args:
+            texts: Documents to analyze
+            preprocessed: Whether the texts already went through the vectorizer's decoder and preprocessor
+
+        Returns:
+            A n_texts x n_features csr_matrix of counts in the vectorizer's dtype
+        """
+        texts = list(texts)
+        if not preprocessed:
+            texts = [self.preprocess(self.vectorizer.decode(text)) for text in texts]
+
+        rows, columns = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for start in range(0, len(texts), KEY_BATCH_SIZE):
+            batch_rows, batch_columns = self._match_batch(texts[start:start + KEY_BATCH_SIZE])
+            rows.append(batch_rows + start)
+            columns.append(batch_columns)
+
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        X = csr_matrix(
+            (np.ones(len(rows), dtype=self.vectorizer.dtype), (rows, columns)),
+            shape=(len(texts), len(self.vectorizer.vocabulary_)),
+            dtype=self.vectorizer.dtype,
+        )
+        X.sum_duplicates()
+        if self.vectorizer.binary:
+            X.data.fill(1)
+        return X
+
+    def transform(self, texts: Iterable) -> csr_matrix:
+        """
+        Equivalent to vectorizer.transform(texts).
+
+        Args:
+            texts: Documents to transform
+
+        Returns:
+            TF-IDF matrix with one row per text
+        """
+        return self.vectorizer._tfidf.transform(self.count_matrix(texts), copy=False)
+
+    def _match_batch(self, docs: list[str]) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+        """Return (row, column) for every vocabulary n-gram occurrence in a batch of preprocessed texts."""
+        codepoints, offsets = encode_codepoints(docs)
+        lengths = np.diff(offsets)
+        whitespace = build_whitespace_table()[codepoints]
+
+        # Whether the previous character is whitespace; the start of a text counts as whitespace
+        previous_whitespace = np.ones(len(codepoints), dtype=np.bool_)
+        previous_whitespace[1:] = whitespace[:-1]
+        previous_whitespace[offsets[:-1][lengths > 0]] = True
+
+        if self.word_boundaries:
+            stream, segment_lengths, segment_docs = self._padded_words(
+                codepoints, whitespace, previous_whitespace, np.repeat(np.arange(len(docs)), lengths)
+            )
+        else:
+            stream, segment_lengths, segment_docs = self._collapsed_texts(
+                codepoints, whitespace, previous_whitespace, offsets, lengths
+            )
+
+        # Characters left in each position's segment, counting the position itself
+        segment_of = np.repeat(np.arange(len(segment_lengths)), segment_lengths)
+        remaining = np.cumsum(segment_lengths)[segment_of] - np.arange(len(stream))
+
+        starts = np.arange(len(stream))
+        prefix_ids = np.zeros(len(stream), dtype=np.int64)
+        rows, columns = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+
+        for n, (keys, key_columns) in enumerate(zip(self.level_keys, self.level_columns), start=1):
+            # No vocabulary term is this long (e.g. max_features kept only shorter n-grams),
+            # so no longer window can match either
+            if len(keys) == 0:
+                break
+            fits = remaining[starts] >= n
+            starts, prefix_ids = starts[fits], prefix_ids[fits]
+            window_keys = prefix_ids * self.radix + stream[starts + n - 1]
+            index = np.minimum(np.searchsorted(keys, window_keys), len(keys) - 1)
+            known = keys[index] == window_keys
+            starts, prefix_ids = starts[known], index[known]
+            if len(starts) == 0:
+                break
+
+            hit_columns = key_columns[prefix_ids]
+            hits = hit_columns >= 0
+            if n < self.min_n:
+                if not self.word_boundaries:
+                    continue
+                # sklearn counts a padded word shorter than min_n once, as a whole
+                hits &= segment_lengths[segment_of[starts]] == n
+            rows.append(segment_docs[segment_of[starts[hits]]])
+            columns.append(hit_columns[hits])
+
+        return np.concatenate(rows), np.concatenate(columns)
+
+    def _padded_words(self, codepoints, whitespace, previous_whitespace, doc_of):
+        """Lay out every whitespace-separated word as " word " (char_wb), one segment per word."""
+        in_word = np.flatnonzero(~whitespace)
+        word_starts = previous_whitespace[in_word]
+        first = np.flatnonzero(word_starts)
+
+        stream = np.full(len(in_word) + 2 * len(first), self.space_code, dtype=np.int64)
+        stream[np.arange(len(in_word)) + 2 * (np.cumsum(word_starts) - 1) + 1] = self.encode(codepoints[in_word])
+
+        word_lengths = np.diff(np.append(first, len(in_word)))
+        return stream, word_lengths + 2, doc_of[in_word[first]]
+
+    def _collapsed_texts(self, codepoints, whitespace, previous_whitespace, offsets, lengths):
+        """Lay out each text with runs of 2+ whitespace characters replaced by one space (char), one segment per text."""
+        continues_run = whitespace & previous_whitespace
+        continues_run[offsets[:-1][lengths > 0]] = False
+
+        codes = self.encode(codepoints)
+        starts_run = np.zeros(len(codepoints), dtype=np.bool_)
+        starts_run[:-1] = whitespace[:-1] & continues_run[1:]
+        codes[starts_run] = self.space_code
+
+        keep = ~continues_run
+        kept_before = np.concatenate([[0], np.cumsum(keep)])
+        return codes[keep], np.diff(kept_before[offsets]), np.arange(len(lengths))
+
+
+class WordNGramCounter:
+    """
+    Counts char_wb n-grams per text by summing cached per-word counts.
+
+    char_wb n-grams never cross a word boundary, so a text's counts are the sum of
+    the counts of its words. Each distinct word is analyzed once, by a
+    CharNGramKeyTable, and kept in a bounded cache across calls; in Zipfian text
+    the cache answers most lookups.
+    """
+
+    def __init__(self, vectorizer: TfidfVectorizer, max_words: int = WORD_CACHE_SIZE):
+        """
+        Args:
+            vectorizer: Fitted TfidfVectorizer accepted by supports()
+            max_words: Maximum number of words whose counts are cached
+
+        Raises:
+            ValueError: If the vectorizer's analyzer is not supported
+        """
+        if not self.supports(vectorizer):
+            raise ValueError(f"Unsupported analyzer {vectorizer.analyzer!r}, expected 'char_wb' on text input")
+
+        self.vectorizer = vectorizer
+        self.preprocess = vectorizer.build_preprocessor()
+        self.table = CharNGramKeyTable(vectorizer)
+        self.cache: WordCache[tuple[NDArray[np.int32], NDArray]] = WordCache(max_words)
+
+    @staticmethod
+    def supports(vectorizer: TfidfVectorizer) -> bool:
+        """
+        Check whether a fitted vectorizer's n-grams can be counted word by word.
+
+        Args:
+            vectorizer: Fitted TfidfVectorizer
+
+        Returns:
+            True for the char_wb analyzer on text input
+        """
+        return vectorizer.analyzer == "char_wb" and vectorizer.input == "content"
+
+    def count_matrix(self, texts: Iterable) -> csr_matrix:
+        """
+        Count vocabulary n-grams per text, like CountVectorizer.transform with the fitted vocabulary.
+
+        Args:
+            texts: Documents to analyze
+
+        Returns:
+            A n_texts x n_features csr_matrix of counts in the vectorizer's dtype
+        """
+        # Local id per distinct word in this call, and the word ids of every text
+        word_ids: dict[str, int] = {}
+        text_words, text_lengths = [], []
+        for text in texts:
+            words = self.preprocess(self.vectorizer.decode(text)).split()
+            text_words.extend(word_ids.setdefault(word, len(word_ids)) for word in words)
+            text_lengths.append(len(words))
+
+        # Repeats within the call reuse the first analysis, so they count as cache hits
+        self.cache.hits += len(text_words) - len(word_ids)
+        word_counts = self._word_counts(list(word_ids))
+        words_per_text = csr_matrix(
+            (np.ones(len(text_words), dtype=word_counts.dtype), np.asarray(text_words, dtype=np.int64),
+             np.concatenate([[0], np.cumsum(text_lengths, dtype=np.int64)])),
+            shape=(len(text_lengths), len(word_ids)),
+        )
+
+        X = (words_per_text @ word_counts).tocsr()
+        X.sort_indices()
+        if self.vectorizer.binary:
+            X.data.fill(1)
+        return X
+
+    def transform(self, texts: Iterable) -> csr_matrix:
+        """
+        Equivalent to vectorizer.transform(texts).
+
+        Args:
+            texts: Documents to transform
+
+        Returns:
+            TF-IDF matrix with one row per text
+        """
+        return self.vectorizer._tfidf.transform(self.count_matrix(texts), copy=False)
+
+    def _word_counts(self, words: list[str]) -> csr_matrix:
+        """Return the n-gram counts of each word as one row per word, analyzing only uncached words."""
+        rows = [self.cache.get(word) for word in words]
+        missing = [i for i, row in enumerate(rows) if row is None]
+
+        if missing:
+            counts = self.table.count_matrix([words[i] for i in missing], preprocessed=True)
+            for k, i in enumerate(missing):
+                row = slice(counts.indptr[k], counts.indptr[k + 1])
+                rows[i] = (counts.indices[row].astype(np.int32), counts.data[row])
+                self.cache.put(words[i], rows[i])
+
+        lengths = np.fromiter((len(indices) for indices, _ in rows), dtype=np.int64, count=len(rows))
+        return csr_matrix(
+            (
+                np.concatenate([data for _, data in rows]) if rows else np.zeros(0, dtype=self.vectorizer.dtype),
+                np.concatenate([indices for indices, _ in rows]) if rows else np.zeros(0, dtype=np.int32),
+                np.concatenate([[0], np.cumsum(lengths)]),
+            ),
+            shape=(len(rows), len(self.vectorizer.vocabulary_)),
+        )
+
+
+def bulk_transformer(vectorizer: TfidfVectorizer, sample_texts: Sequence | None = None) -> WordNGramCounter | CharNGramKeyTable | TfidfVectorizer:
+    """
+    Pick the fastest exact way to transform many texts with a fitted vectorizer.
+
+    When sample texts are given, the fast path is first checked against
+    vectorizer.transform on up to VERIFY_SAMPLE_SIZE of them, and the vectorizer
+    itself is used (with a warning) if the two disagree.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        sample_texts: Texts representative of the ones that will be transformed
+
+    Returns:
+        An object whose transform(texts) equals vectorizer.transform(texts)
+    """
+    if WordNGramCounter.supports(vectorizer):
+        transformer = WordNGramCounter(vectorizer)
+    elif CharNGramKeyTable.supports(vectorizer):
+        transformer = CharNGramKeyTable(vectorizer)
+    else:
+        return vectorizer
+
+    if sample_texts is not None:
+        sample = list(sample_texts[:VERIFY_SAMPLE_SIZE])
+        difference = transformer.transform(sample) - vectorizer.transform(sample)
+        if difference.nnz and np.abs(difference.data).max() > VERIFY_TOLERANCE:
+            warnings.warn(
+                f"{type(transformer).__name__} disagrees with TfidfVectorizer.transform on sample texts; "
+                "falling back to the vectorizer",
+                RuntimeWarning,
+            )
+            return vectorizer
+    return transformer
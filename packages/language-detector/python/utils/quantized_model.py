@@ -0,0 +1,262 @@
+from pathlib import Path
+from typing import Sequence
+
+import joblib
+import numpy as np
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+from scipy.special import expit, softmax
+from sklearn.ensemble import VotingClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.multiclass import OneVsRestClassifier
+
+QUANTIZATION_MODES = ("float16", "int8")
+INT8_MAX = 127
+SCORE_CHUNK_ROWS = 2_048  # bounds the (classes x non-zeros) gather buffer
+CONSTANT_LOGIT = 100.0  # expit of +/- this is exactly 1 / effectively 0 in float32
+
+
+def quantize_rows(weights: np.ndarray, mode: str) -> tuple[np.ndarray, NDArray[np.float32] | None]:
+    """
+    Quantize a weight matrix row by row.
+
+    Args:
+        weights: Array of shape (n_classes, n_features)
+        mode: "float16", or "int8" with one float32 scale per row
+
+    Returns:
+        Tuple containing the quantized weights and the per-row scales (None for float16)
+
+    Raises:
+        ValueError: If mode is not one of QUANTIZATION_MODES
+    """
+    if mode == "float16":
+        return weights.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(weights).max(axis=1) / INT8_MAX
+        scales[scales == 0] = 1.0
+        quantized = np.rint(weights / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+
+
+def linear_scores(X: csr_matrix, weights: np.ndarray, scales: NDArray[np.float32] | None) -> NDArray[np.float32]:
+    """
+    Compute X @ weights.T for quantized weights without dequantizing the whole matrix.
+
+    Only the weight columns of features present in X are gathered and widened to
+    float32, which keeps single-row calls cheap.
+
+    Args:
+        X: Feature rows
+        weights: Quantized weights of shape (n_classes, n_features)
+        scales: Per-row scales for int8 weights, or None
+
+    Returns:
+        Scores of shape (n_rows, n_classes)
+    """
+    X = csr_matrix(X)
+    scores = np.zeros((X.shape[0], weights.shape[0]), dtype=np.float32)
+
+    for start in range(0, X.shape[0], SCORE_CHUNK_ROWS):
+        chunk = X[start:start + SCORE_CHUNK_ROWS]
+        nonempty = np.flatnonzero(np.diff(chunk.indptr))
+        if len(nonempty) == 0:
+            continue
+        contributions = weights[:, chunk.indices].astype(np.float32)
+        contributions *= chunk.data
+        scores[start + nonempty] = np.add.reduceat(contributions, chunk.indptr[nonempty], axis=1).T
+
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def logreg_weights(logreg) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stack the coefficients and intercepts of a fitted logistic regression.
+
+    One-vs-rest fits a constant predictor instead of a logistic regression for a
+    class column that holds a single value; it becomes a zero coefficient row with
+    an intercept large enough to reproduce its constant probability.
+
+    Args:
+        logreg: Fitted LogisticRegression or OneVsRestClassifier of logistic regressions
+
+    Returns:
+        Tuple containing the coefficients of shape (n_classes, n_features) and the intercepts
+    """
+    if not isinstance(logreg, OneVsRestClassifier):
+        return logreg.coef_, logreg.intercept_
+
+    coef = np.zeros((len(logreg.estimators_), logreg.n_features_in_))
+    intercept = np.zeros(len(logreg.estimators_))
+    for i, estimator in enumerate(logreg.estimators_):
+        if hasattr(estimator, "coef_"):
+            coef[i] = estimator.coef_.ravel()
+            intercept[i] = estimator.intercept_[0]
+        elif hasattr(estimator, "y_"):
+            intercept[i] = CONSTANT_LOGIT if estimator.y_[0] else -CONSTANT_LOGIT
+        else:
+            raise ValueError(f"Cannot quantize one-vs-rest estimator {type(estimator).__name__}")
+    return coef, intercept
+
+
+class QuantizedEnsemble:
+    """
+    Quantized copy of the soft-voting ComplementNB + logistic regression ensemble.
+
+    predict and predict_proba follow VotingClassifier: the class probabilities of
+    both halves are averaged and the most probable class is returned.
+    """
+
+    def __init__(self, model: VotingClassifier, mode: str):
+        """
+        Args:
+            model: Fitted ensemble from train_model
+            mode: One of QUANTIZATION_MODES
+        """
+        self.mode = mode
+        self.classes_ = np.asarray(model.classes_)
+
+        # A weight shared by every class cancels out of the NB softmax, so centering each
+        # column only shrinks the range the quantizer has to cover
+        nb_log_prob = model.named_estimators_["nb"].feature_log_prob_
+        nb_log_prob = nb_log_prob - nb_log_prob.mean(axis=0)
+        self.nb_weights_, self.nb_scales_ = quantize_rows(nb_log_prob, mode)
+
+        coef, intercept = logreg_weights(model.named_estimators_["logreg"])
+        self.lr_weights_, self.lr_scales_ = quantize_rows(coef, mode)
+        self.lr_intercept_ = intercept.astype(np.float32)
+
+    @property
+    def n_features_in_(self) -> int:
+        return self.lr_weights_.shape[1]
+
+    def predict_proba(self, X: csr_matrix) -> NDArray[np.float32]:
+        """
+        Args:
+            X: Feature rows
+
+        Returns:
+            Class probabilities of shape (n_rows, n_classes)
+        """
+        nb_proba = softmax(linear_scores(X, self.nb_weights_, self.nb_scales_), axis=1)
+
+        lr_proba = expit(linear_scores(X, self.lr_weights_, self.lr_scales_) + self.lr_intercept_)
+        if lr_proba.shape[1] == 1:  # binary: one classifier for the positive class
+            lr_proba = np.hstack([1 - lr_proba, lr_proba])
+        lr_proba /= lr_proba.sum(axis=1, keepdims=True)
+
+        return (nb_proba + lr_proba) / 2
+
+    def predict(self, X: csr_matrix) -> np.ndarray:
+        """
+        Args:
+            X: Feature rows
+
+        Returns:
+            Predicted class labels
+        """
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def pack_vectorizer(vectorizer: TfidfVectorizer) -> dict:
+    """
+    Store a fitted vectorizer as its parameters, its terms and float16 IDF weights.
+
+    Terms are kept as one UTF-8 buffer plus per-term byte lengths, which is a fraction
+    of the size of a pickled vocabulary dict or a fixed-width string array.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+
+    Returns:
+        Dict that unpack_vectorizer turns back into a working vectorizer
+    """
+    encoded = [term.encode("utf-8") for term in sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)]
+    return {
+        "params": vectorizer.get_params(),
+        "terms": b"".join(encoded),
+        "term_lengths": np.fromiter(map(len, encoded), dtype=np.uint16, count=len(encoded)),
+        "idf": vectorizer.idf_.astype(np.float16),
+    }
+
+
+def unpack_vectorizer(packed: dict) -> TfidfVectorizer:
+    """
+    Rebuild a fitted TfidfVectorizer from pack_vectorizer output.
+
+    Args:
+        packed: Dict returned by pack_vectorizer
+
+    Returns:
+        Fitted TfidfVectorizer
+    """
+    blob = packed["terms"]
+    ends = np.cumsum(packed["term_lengths"], dtype=np.int64).tolist()
+    starts = [0] + ends[:-1]
+
+    vectorizer = TfidfVectorizer(**packed["params"])
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.vocabulary_ = {blob[a:b].decode("utf-8"): i for i, (a, b) in enumerate(zip(starts, ends))}
+    vectorizer.idf_ = packed["idf"].astype(vectorizer.dtype)
+    vectorizer._tfidf.n_features_in_ = len(ends)
+    return vectorizer
+
+
+def quantized_model_path(model_assets: Path, model_type: str) -> Path:
+    """Location of a tier's quantized bundle."""
+    return model_assets / "quantized" / f"ld_{model_type}_quantized.joblib"
+
+
+def source_stamp(files: Sequence[Path]) -> list[tuple[str, int, int]]:
+    """
+    Identify the files a quantized bundle was exported from by name, size and modification time.
+
+    Every retrain, prune or re-vectorization rewrites the files and so changes the
+    stamp, and taking it costs a stat call per file rather than reading them.
+
+    Args:
+        files: The tier's vectorizer and model files, in that order
+
+    Returns:
+        (name, size, mtime_ns) of each file
+    """
+    return [(file.name, file.stat().st_size, file.stat().st_mtime_ns) for file in files]
+
+
+def save_quantized_tools(path: Path, vectorizer: TfidfVectorizer, model: QuantizedEnsemble,
+                         source: list[tuple[str, int, int]] | None = None) -> None:
+    """
+    Write a vectorizer and quantized model as a single bundle.
+
+    Args:
+        path: File to write
+        vectorizer: Fitted TfidfVectorizer
+        model: Quantized ensemble
+        source: source_stamp of the files the bundle was exported from
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"vectorizer": pack_vectorizer(vectorizer), "model": model, "source": source}, path)
+
+
+def load_quantized_tools(path: Path, source_files: Sequence[Path] = ()) -> tuple[TfidfVectorizer, QuantizedEnsemble] | None:
+    """
+    Load a bundle written by save_quantized_tools.
+
+    When the files it was exported from are all present, the bundle is only used if
+    it was exported from their current versions; after a retrain or prune it is stale.
+
+    Args:
+        path: Bundle file
+        source_files: The tier's vectorizer and model files, in that order
+
+    Returns:
+        Tuple containing the vectorizer and the quantized model, or None if the bundle is stale
+    """
+    bundle = joblib.load(path)
+    if source_files and all(file.exists() for file in source_files):
+        if bundle.get("source") != source_stamp(source_files):
+            return None
+    return unpack_vectorizer(bundle["vectorizer"]), bundle["model"]
@@ -0,0 +1,188 @@
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+
+CSR_ARRAYS = ("data", "indices", "indptr")
+
+
+def save_csr(directory: Path, X: csr_matrix, y: np.ndarray) -> None:
+    """
+    Save a CSR matrix and its labels as plain .npy files.
+
+    Args:
+        directory: Directory to write data.npy, indices.npy, indptr.npy, shape.npy and labels.npy to
+        X: The matrix to save
+        y: The labels, one per row
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    X = csr_matrix(X)
+    for name in CSR_ARRAYS:
+        np.save(directory / f"{name}.npy", getattr(X, name))
+    np.save(directory / "shape.npy", np.asarray(X.shape, dtype=np.int64))
+    # Fixed-width strings instead of objects, so labels can be memory-mapped too
+    np.save(directory / "labels.npy", np.asarray(y).astype(str))
+
+
+def load_csr(directory: Path, mmap_mode: str | None = "r") -> tuple[csr_matrix, NDArray[np.str_]]:
+    """
+    Open a CSR matrix and its labels saved by save_csr.
+
+    With a mmap_mode the matrix is backed by the files on disk, so slicing rows only
+    reads and copies the rows that are selected.
+
+    Args:
+        directory: Directory the matrix was saved to
+        mmap_mode: numpy memory-map mode, or None to read everything into memory
+
+    Returns:
+        Tuple containing the matrix and the labels
+
+    Raises:
+        FileNotFoundError: If any of the arrays is missing
+    """
+    data, indices, indptr = (
+        np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in CSR_ARRAYS
+    )
+    shape = tuple(np.load(directory / "shape.npy"))
+    X = csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    y = np.load(directory / "labels.npy", mmap_mode=mmap_mode)
+    return X, y
+
+
+def save_rows(directory: Path, X: csr_matrix, y: np.ndarray, rows: np.ndarray, chunk_size: int = 100_000) -> None:
+    """
+    Save a subset of rows as a new matrix in the save_csr layout, one chunk at a time.
+
+    The output arrays are written through memory maps, so only chunk_size rows are
+    ever held in memory.
+
+    Args:
+        directory: Directory to write the subset to
+        X: Source matrix (may itself be memory-mapped)
+        y: Labels for all rows of X
+        rows: Row indices to keep, in output order
+        chunk_size: Number of rows copied per chunk
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.diff(X.indptr)[rows], out=indptr[1:])
+    nnz = int(indptr[-1])
+
+    # Use the index dtype scipy would choose, so reopening the files does not copy them
+    index_dtype = np.int32 if max(nnz, X.shape[1]) < np.iinfo(np.int32).max else np.int64
+
+    data = open_memmap(directory / "data.npy", mode="w+", dtype=X.data.dtype, shape=(nnz,))
+    indices = open_memmap(directory / "indices.npy", mode="w+", dtype=index_dtype, shape=(nnz,))
+
+    for start in range(0, len(rows), chunk_size):
+        chunk_rows = rows[start:start + chunk_size]
+        chunk = X[chunk_rows]
+        lo, hi = indptr[start], indptr[start + len(chunk_rows)]
+        data[lo:hi] = chunk.data
+        indices[lo:hi] = chunk.indices
+
+    data.flush()
+    indices.flush()
+    del data, indices
+
+    np.save(directory / "indptr.npy", indptr.astype(index_dtype))
+    np.save(directory / "shape.npy", np.asarray((len(rows), X.shape[1]), dtype=np.int64))
+    np.save(directory / "labels.npy", np.asarray(y[rows]).astype(str))
+
+
+def save_columns(directory: Path, X: csr_matrix, y: np.ndarray, columns: np.ndarray,
+                 transform: Callable[[csr_matrix], csr_matrix] | None = None, chunk_size: int = 100_000) -> None:
+    """
+    Save a subset of columns of every row in the save_csr layout, one chunk at a time.
+
+    The row lengths are counted in a first pass over the indices, so the output arrays
+    can be written through memory maps and only chunk_size rows are ever held in memory.
+
+    Args:
+        directory: Directory to write the subset to; must not be the directory X was loaded from
+        X: Source matrix (may itself be memory-mapped)
+        y: Labels for all rows of X
+        columns: Sorted column indices to keep
+        transform: Applied to each chunk after slicing; must keep its sparsity pattern (e.g. row normalization)
+        chunk_size: Number of rows copied per chunk
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+
+    keep = np.zeros(X.shape[1], dtype=bool)
+    keep[columns] = True
+
+    indptr = np.zeros(X.shape[0] + 1, dtype=np.int64)
+    for start in range(0, X.shape[0], chunk_size):
+        stop = min(start + chunk_size, X.shape[0])
+        lo, hi = X.indptr[start], X.indptr[stop]
+        kept_so_far = np.concatenate([[0], np.cumsum(keep[X.indices[lo:hi]])])
+        bounds = np.asarray(X.indptr[start:stop + 1]) - lo
+        indptr[start + 1:stop + 1] = indptr[start] + kept_so_far[bounds[1:]]
+    nnz = int(indptr[-1])
+
+    # Use the index dtype scipy would choose, so reopening the files does not copy them
+    index_dtype = np.int32 if max(nnz, len(columns)) < np.iinfo(np.int32).max else np.int64
+
+    data = open_memmap(directory / "data.npy", mode="w+", dtype=X.data.dtype, shape=(nnz,))
+    indices = open_memmap(directory / "indices.npy", mode="w+", dtype=index_dtype, shape=(nnz,))
+
+    for start in range(0, X.shape[0], chunk_size):
+        stop = min(start + chunk_size, X.shape[0])
+        chunk = csr_matrix(X[start:stop][:, columns])
+        if transform is not None:
+            chunk = csr_matrix(transform(chunk))
+        lo, hi = indptr[start], indptr[stop]
+        data[lo:hi] = chunk.data
+        indices[lo:hi] = chunk.indices
+
+    data.flush()
+    indices.flush()
+    del data, indices
+
+    np.save(directory / "indptr.npy", indptr.astype(index_dtype))
+    np.save(directory / "shape.npy", np.asarray((X.shape[0], len(columns)), dtype=np.int64))
+    np.save(directory / "labels.npy", np.asarray(y).astype(str))
+
+
+def save_split(path: Path, train_rows: np.ndarray, test_rows: np.ndarray, validation_rows: np.ndarray | None = None) -> None:
+    """
+    Save train/test (and optionally validation) row indices into a matrix saved by save_csr.
+
+    Args:
+        path: .npz file to write
+        train_rows: Row indices of the training split
+        test_rows: Row indices of the test split
+        validation_rows: Row indices held out of training for tuning post-training steps
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    splits = {"train": np.sort(train_rows), "test": np.sort(test_rows)}
+    if validation_rows is not None:
+        splits["validation"] = np.sort(validation_rows)
+    np.savez(path, **splits)
+
+
+def load_split(matrix_dir: Path, split_path: Path, split: str) -> tuple[csr_matrix, NDArray[np.str_]]:
+    """
+    Load one split by slicing its rows out of the memory-mapped matrix.
+
+    Args:
+        matrix_dir: Directory the full matrix was saved to by save_csr
+        split_path: .npz file written by save_split
+        split: "train", "validation" or "test"
+
+    Returns:
+        Tuple containing the split's rows of the matrix and their labels
+
+    Raises:
+        FileNotFoundError: If the matrix or split file is missing
+        KeyError: If the split file has no such split
+    """
+    with np.load(split_path) as splits:
+        rows = splits[split]
+    X, y = load_csr(matrix_dir)
+    return X[rows], np.asarray(y[rows])
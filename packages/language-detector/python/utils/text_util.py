@@ -1,4 +1,11 @@
 import regex, unicodedata
+from functools import lru_cache
+from typing import Iterable
+
+import numpy as np
+from numpy.typing import NDArray
+
+MAX_CODEPOINT = 0x110000
 
 def strip_ascii(text: str) -> str:
     """
@@ -11,4 +18,84 @@ def strip_ascii(text: str) -> str:
         The text with ASCII characters stripped
     """
     normalized = unicodedata.normalize("NFC", text)
-    return regex.sub(r"[A-Za-z0-9]+", "", normalized)
\ No newline at end of file
+    return regex.sub(r"[A-Za-z0-9]+", "", normalized)
+
+
+@lru_cache(maxsize=None)
+def build_codepoint_table(char_class: str) -> NDArray[np.bool_]:
+    """
+    Build a lookup table marking every codepoint matched by a regex character class.
+
+    The table is derived from the `regex` module itself, so lookups give exactly the
+    same decisions as matching the character class one character at a time.
+
+    Args:
+        char_class: A single-character regex class, e.g. r"[\\p{Latin}\\p{Nd}]"
+
+    Returns:
+        A boolean array of length 0x110000 indexed by codepoint
+    """
+    all_codepoints = "".join(map(chr, range(MAX_CODEPOINT)))
+    table = np.zeros(MAX_CODEPOINT, dtype=np.bool_)
+    matches = [m.start() for m in regex.finditer(char_class, all_codepoints)]
+    table[np.asarray(matches, dtype=np.int64)] = True
+    return table
+
+
+@lru_cache(maxsize=None)
+def build_whitespace_table() -> NDArray[np.bool_]:
+    """
+    Build a lookup table marking every codepoint that str.isspace() accepts.
+
+    This is the whitespace definition used by str.split() and by the \\s class of
+    the standard re module, which sklearn's analyzers rely on.
+
+    Returns:
+        A boolean array of length 0x110000 indexed by codepoint
+    """
+    table = np.zeros(MAX_CODEPOINT, dtype=np.bool_)
+    table[[c for c in range(MAX_CODEPOINT) if chr(c).isspace()]] = True
+    return table
+
+
+def encode_codepoints(texts: Iterable[str]) -> tuple[NDArray[np.uint32], NDArray[np.int64]]:
+    """
+    Pack a batch of strings into a single codepoint buffer.
+
+    Args:
+        texts: The strings to pack
+
+    Returns:
+        A tuple of (codepoints, offsets) where the codepoints of text i are
+        codepoints[offsets[i]:offsets[i + 1]]
+    """
+    texts = list(texts)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = "".join(texts).encode("utf-32-le", errors="surrogatepass")
+    return np.frombuffer(buffer, dtype=np.uint32), offsets
+
+
+def reduce_codepoint_segments(
+    in_class: NDArray[np.bool_], offsets: NDArray[np.int64], require_all: bool
+) -> NDArray[np.bool_]:
+    """
+    Reduce a per-codepoint class mask to one flag per packed string.
+
+    Args:
+        in_class: Per-codepoint flags, e.g. table[codepoints]
+        offsets: String offsets from encode_codepoints
+        require_all: If True, flag strings made up entirely of flagged codepoints;
+            otherwise flag strings containing at least one flagged codepoint
+
+    Returns:
+        A boolean np.ndarray with one flag per string (always False for empty strings)
+    """
+    nonempty = np.diff(offsets) > 0
+    flags = np.zeros(len(nonempty), dtype=np.bool_)
+    if nonempty.any():
+        # reduceat misreports empty segments, so only reduce over non-empty strings
+        reducer = np.logical_and if require_all else np.logical_or
+        flags[nonempty] = reducer.reduceat(in_class, offsets[:-1][nonempty])
+    return flags
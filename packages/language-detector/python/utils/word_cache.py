@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+WORD_CACHE_SIZE = 200_000  # words kept per cache; Zipfian corpora need far fewer for most of their tokens
+
+Value = TypeVar("Value")
+
+
+class WordCache(Generic[Value]):
+    """
+    Bounded least-recently-used cache of per-word feature values.
+
+    Lookups are counted so callers can report how much repeated work was saved.
+    """
+
+    def __init__(self, max_words: int = WORD_CACHE_SIZE):
+        """
+        Args:
+            max_words: Maximum number of words kept before the least recently used ones are evicted
+        """
+        self.max_words = max_words
+        self.hits = 0
+        self.misses = 0
+        self._values: OrderedDict[Hashable, Value] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, word: Hashable) -> Value | None:
+        """
+        Look up a word, counting the hit or miss.
+
+        Args:
+            word: Word to look up
+
+        Returns:
+            The cached value, or None if the word is not cached
+        """
+        value = self._values.get(word)
+        if value is None:
+            self.misses += 1
+            return None
+        self._values.move_to_end(word)
+        self.hits += 1
+        return value
+
+    def put(self, word: Hashable, value: Value) -> None:
+        """
+        Store a word's value, evicting the least recently used word when full.
+
+        Args:
+            word: Word to store
+            value: Its feature value; must not be None
+        """
+        self._values[word] = value
+        self._values.move_to_end(word)
+        if len(self._values) > self.max_words:
+            self._values.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def describe(self) -> str:
+        """One-line summary of the cache's size and hit rate, for logs."""
+        return (
+            f"{len(self._values):,}/{self.max_words:,} words cached, "
+            f"{self.hits:,} hits / {self.hits + self.misses:,} lookups ({self.hit_rate:.1%})"
+        )
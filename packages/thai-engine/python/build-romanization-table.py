@@ -0,0 +1,68 @@
+# build-romanization-table.py
+#
+# Usage:
+#   python build-romanization-table.py [top_n]
+#
+# Romanizes the top_n most frequent words of the Thai National Corpus frequency list
+# with the current engine and writes thai-romanization-table.json.gz next to
+# python-thai-romanization.py. The table records the engine version it was built
+# with and is ignored at runtime once the engine or its models change, so it has to
+# be rebuilt whenever pythainlp is upgraded; the binary build does this before packaging.
+import gzip, importlib.util, json, os, sys
+
+from pythainlp.corpus import tnc
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOP_N = 20_000
+
+
+def load_romanizer():
+    """Import python-thai-romanization.py, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location(
+        "python_thai_romanization", os.path.join(HERE, "python-thai-romanization.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def most_frequent_words(top_n: int, is_thai) -> list[str]:
+    """The top_n most frequent Thai-only words, most frequent first."""
+    words = []
+    for word, _ in sorted(tnc.word_freqs(), key=lambda pair: -pair[1]):
+        if is_thai(word):
+            words.append(word)
+            if len(words) == top_n:
+                break
+    return words
+
+
+def build_table(top_n: int = TOP_N) -> None:
+    romanizer = load_romanizer()
+    words = most_frequent_words(top_n, romanizer.THAI_ONLY.match)
+    romanized = romanizer.romanize_tokens(set(words))
+
+    table = {
+        "version": romanizer.engine_version(),
+        "romanizations": {word: romanized[word] for word in words},
+    }
+    # mtime=0 keeps the file byte-identical across rebuilds with the same engine
+    data = gzip.compress(
+        json.dumps(table, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), compresslevel=9, mtime=0
+    )
+    path = romanizer.table_path()
+    with open(path, "wb") as f:
+        f.write(data)
+
+    print(f"Wrote {len(words):,} romanizations for {table['version']} to {path} ({len(data) / 1024:.0f} KiB)")
+
+
+def main() -> None:
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python build-romanization-table.py [top_n]")
+    build_table(int(sys.argv[1]) if len(sys.argv) == 2 else TOP_N)
+
+
+if __name__ == "__main__":
+    main()
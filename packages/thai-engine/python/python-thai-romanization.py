@@ -1,25 +1,391 @@
 # romanize.py
-import re, sys
-from pythainlp.transliterate import romanize
+#
+# Usage:
+#   python-thai-romanization.py <segmented string>   romanize one string and exit
+#   python-thai-romanization.py --batch               romanize a JSON array of strings read from stdin
+#   python-thai-romanization.py --serve               answer JSON-lines requests on stdin
+#   python-thai-romanization.py --cache-stats         print the on-disk token cache statistics
+#   python-thai-romanization.py --document [path]     romanize one long segmented text read from
+#                                                     path or stdin, using a pool of processes
+#
+# In --serve mode each stdin line is a request {"id": ..., "text": <segmented string>}
+# or {"id": ..., "texts": [<segmented string>, ...]}, and each stdout line is the
+# matching reply {"id": ..., "result": ...}, {"id": ..., "results": [...]} or
+# {"id": ..., "error": ...}, written in request order. The ONNX engine is loaded
+# once and kept for the life of the process.
+#
+# Setting THAI_ROMANIZATION_CACHE to a file path enables an on-disk cache of token
+# romanizations shared by every process using that file, so known tokens skip the
+# engine even across per-string invocations. THAI_ROMANIZATION_CACHE_MAX_ENTRIES caps
+# its size.
+#
+# Tokens found in thai-romanization-table.json.gz next to this script (built by
+# build-romanization-table.py for the most frequent words) skip the engine entirely.
+#
+# Tokens are romanized in batched ONNX runs of up to THAI_ROMANIZATION_BATCH_SIZE
+# tokens; THAI_ROMANIZATION_THREADS sets ONNX Runtime's intra-op thread count.
+# --document spreads the document's distinct tokens over THAI_ROMANIZATION_WORKERS
+# processes (default: one per CPU) and reassembles the text once, so the spacing and
+# punctuation cleanup sees the whole document exactly as in the other modes.
+import gzip, hashlib, json, multiprocessing, os, re, sqlite3, sys, time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
 
+import pythainlp
+from pythainlp.transliterate import romanize
 
-text = sys.argv[1]
 
+SEPARATOR = "\U000f0000\U000f0001"
 THAI_ONLY = re.compile(r"^[\u0E00-\u0E7F]+$")
+ENGINE = "thai2rom_onnx"
+ENGINE_MODELS = ("thai2rom_encoder_onnx", "thai2rom_decoder_onnx", "thai2rom_config_onnx")
+TABLE_FILE = "thai-romanization-table.json.gz"
+
+CACHE_ENV = "THAI_ROMANIZATION_CACHE"
+CACHE_MAX_ENTRIES_ENV = "THAI_ROMANIZATION_CACHE_MAX_ENTRIES"
+CACHE_MAX_ENTRIES = 200_000
+CACHE_EVICT_FRACTION = 0.1  # evict this much extra below the cap so eviction runs rarely
+CACHE_QUERY_SIZE = 500  # tokens per lookup query, below SQLite's bound-parameter limit
+CACHE_BUSY_TIMEOUT = 30  # seconds to wait for another process's write to finish
+
+BATCH_SIZE_ENV = "THAI_ROMANIZATION_BATCH_SIZE"
+THREADS_ENV = "THAI_ROMANIZATION_THREADS"
+BATCH_SIZE = 64
+
+WORKERS_ENV = "THAI_ROMANIZATION_WORKERS"
+PARALLEL_MIN_TOKENS = 1_000  # below this many tokens to romanize, starting workers costs more than it saves
+
+
+@lru_cache(maxsize=None)
+def engine_version() -> str:
+    """Identify the engine and its model files, so romanizations made with other models are never reused."""
+    from pythainlp.corpus import get_corpus_path
+
+    digest = hashlib.sha256()
+    for name in ENGINE_MODELS:
+        with open(get_corpus_path(name), "rb") as f:
+            digest.update(f.read())
+    return f"{ENGINE};pythainlp={pythainlp.__version__};models={digest.hexdigest()[:16]}"
+
+
+def table_path() -> str:
+    # PyInstaller unpacks bundled data files under sys._MEIPASS
+    return os.path.join(getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__))), TABLE_FILE)
+
+
+@lru_cache(maxsize=None)
+def romanization_table() -> dict[str, str]:
+    """Load the precomputed table of frequent words, or an empty one if it is missing or was built for another engine."""
+    path = table_path()
+    if not os.path.exists(path):
+        return {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        table = json.load(f)
+    if table["version"] != engine_version():
+        print(
+            f"Ignoring {TABLE_FILE}: built for {table['version']}, engine is {engine_version()}. "
+            "Rebuild it with build-romanization-table.py.",
+            file=sys.stderr,
+        )
+        return {}
+    return table["romanizations"]
+
+
+class TokenCache:
+    """
+    On-disk cache of token romanizations, safe to share between processes.
+
+    SQLite in WAL mode lets any number of readers run alongside one writer, and
+    writers wait on each other through the busy timeout. Entries are keyed by token
+    and engine version and evicted least recently used first, so entries of an old
+    engine version are never read again and age out.
+    """
+
+    def __init__(self, path: str, version: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.db = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "token TEXT NOT NULL, version TEXT NOT NULL, romanized TEXT NOT NULL, used REAL NOT NULL, "
+                "PRIMARY KEY (token, version)) WITHOUT ROWID"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS tokens_used ON tokens (used)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def get_many(self, tokens: set[str]) -> dict[str, str]:
+        """Return the cached romanization of every token that has one."""
+        tokens = list(tokens)
+        found = {}
+        for start in range(0, len(tokens), CACHE_QUERY_SIZE):
+            chunk = tokens[start:start + CACHE_QUERY_SIZE]
+            rows = self.db.execute(
+                f"SELECT token, romanized FROM tokens WHERE version = ? AND token IN ({','.join('?' * len(chunk))})",
+                [self.version, *chunk],
+            )
+            found.update(rows)
+        self.hits += len(found)
+        self.misses += len(tokens) - len(found)
+        return found
+
+    def put_many(self, romanized: dict[str, str], used: set[str]) -> None:
+        """
+        Store new romanizations, mark cached ones as recently used and evict if over the cap.
+
+        Everything happens in one write transaction, together with the persistent hit counters.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO tokens (token, version, romanized, used) VALUES (?, ?, ?, ?)",
+                [(token, self.version, value, now) for token, value in romanized.items()],
+            )
+            self.db.executemany(
+                "UPDATE tokens SET used = ? WHERE token = ? AND version = ?",
+                [(now, token, self.version) for token in used],
+            )
+            self.db.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                [("hits", len(used)), ("misses", len(romanized))],
+            )
+            if romanized:
+                self._evict()
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries once the cache is over its cap."""
+        (entries,) = self.db.execute("SELECT COUNT(*) FROM tokens").fetchone()
+        if entries <= self.max_entries:
+            return
+        excess = entries - int(self.max_entries * (1 - CACHE_EVICT_FRACTION))
+        self.db.execute(
+            "DELETE FROM tokens WHERE (token, version) IN (SELECT token, version FROM tokens ORDER BY used LIMIT ?)",
+            (excess,),
+        )
+
+    def stats(self) -> dict:
+        """Entry count and hit rates, for this process and for every process sharing the file."""
+        (entries,) = self.db.execute("SELECT COUNT(*) FROM tokens").fetchone()
+        totals = dict(self.db.execute("SELECT name, value FROM stats"))
+        hits, misses = totals.get("hits", 0), totals.get("misses", 0)
+        return {
+            "version": self.version,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+        }
+
+
+def load_batchable_session(path: str, intra_op_threads: int = 0):
+    """
+    Load an ONNX model with its batch dimension made symbolic.
+
+    pythainlp's exported thai2rom graphs pin the batch dimension of their inputs and
+    outputs to 1 although every operation inside accepts any batch size. Without the
+    onnx package the model is loaded as is and only runs one token at a time.
+    """
+    from onnxruntime import InferenceSession, SessionOptions
+
+    options = SessionOptions()
+    if intra_op_threads > 0:
+        options.intra_op_num_threads = intra_op_threads
+
+    try:
+        import onnx
+    except ImportError:
+        return InferenceSession(path, options)
+
+    model = onnx.load(path)
+    for value in list(model.graph.input) + list(model.graph.output):
+        for i, dim in enumerate(value.type.tensor_type.shape.dim):
+            if dim.dim_value == 1:
+                dim.dim_param = f"{value.name}_dim_{i}"
+    # Inferred intermediate shapes carry the same pinned batch size
+    for value in model.graph.value_info:
+        value.type.tensor_type.ClearField("shape")
+    return InferenceSession(model.SerializeToString(), options)
+
+
+class BatchedThai2Rom:
+    """
+    Runs pythainlp's thai2rom ONNX encoder/decoder on many tokens at once.
+
+    Tokens are grouped by length so a batch never needs padding, which keeps every
+    token's encoder input exactly what a single-token run sees. Decoding follows
+    pythainlp's greedy loop per token, stopping each one at its first end symbol.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, intra_op_threads: int = 0):
+        from pythainlp.corpus import get_corpus_path
+        from pythainlp.transliterate import thai2rom_onnx
+
+        self.batch_size = max(1, batch_size)
+        self.engine = thai2rom_onnx._THAI_TO_ROM_ONNX
+        self.encoder = load_batchable_session(get_corpus_path(thai2rom_onnx._MODEL_ENCODER_NAME), intra_op_threads)
+        self.decoder = load_batchable_session(get_corpus_path(thai2rom_onnx._MODEL_DECODER_NAME), intra_op_threads)
+
+        self.start = self.engine._target_char_to_ix["<start>"]
+        self.end = self.engine._target_char_to_ix["<end>"]
+        self.encoder_outputs = [output.name for output in self.encoder.get_outputs()]
+        self.decoder_outputs = [output.name for output in self.decoder.get_outputs()[:2]]
+
+    def romanize_many(self, tokens: set[str]) -> dict[str, str]:
+        """Romanize each token, same as romanize(token, engine="thai2rom_onnx")."""
+        by_length = defaultdict(list)
+        for token in tokens:
+            by_length[len(token)].append(token)
+
+        romanized = {}
+        for same_length in by_length.values():
+            start = 0
+            while start < len(same_length):
+                batch = same_length[start:start + self.batch_size]
+                try:
+                    romanized.update(zip(batch, self._run(batch)))
+                except Exception as e:
+                    if len(batch) == 1:
+                        raise
+                    # Model files exported with a fixed batch dimension only accept one token per run
+                    print(f"Batched ONNX run failed, falling back to single tokens: {e}", file=sys.stderr)
+                    self.batch_size = 1
+                    continue
+                start += len(batch)
+        return romanized
+
+    def _run(self, tokens: list[str]) -> list[str]:
+        source = np.stack([self.engine._prepare_sequence_in(token) for token in tokens])
+        batch_size = len(tokens)
+
+        encoder_outputs, encoder_hidden, _ = self.encoder.run(
+            self.encoder_outputs,
+            {"input_tensor": source, "input_lengths": [source.shape[1]] * batch_size},
+        )
+        hidden = np.concatenate((encoder_hidden[0], encoder_hidden[1]), axis=1)[None]
+        mask = (source[:, :encoder_outputs.shape[1]] != 0).astype(np.float32)
+
+        decoder_input = np.full((batch_size, 1), self.start, dtype=np.int32)
+        steps = []
+        finished = np.zeros(batch_size, dtype=bool)
+        lengths = np.full(batch_size, self.engine._maxlength)
+
+        for step in range(self.engine._maxlength):
+            decoder_output, hidden = self.decoder.run(
+                self.decoder_outputs,
+                {
+                    "decoder_input": decoder_input,
+                    "decoder_hidden_1": hidden,
+                    "encoder_outputs": encoder_outputs,
+                    "mask": mask,
+                },
+            )
+            top = np.argmax(decoder_output, axis=1)
+            steps.append(top)
+
+            ended = (top == self.end) & ~finished
+            lengths[ended] = step
+            finished |= ended
+            if finished.all():
+                break
+            decoder_input = top.reshape(batch_size, 1).astype(np.int32)
+
+        symbols = np.stack(steps, axis=1)
+        ix_to_char = self.engine._ix_to_target_char
+        # pythainlp returns "<PAD>" when the very first symbol ends the sequence
+        return [
+            "".join(ix_to_char[str(ix)] for ix in symbols[row, :length]) if length else "<PAD>"
+            for row, length in enumerate(lengths.tolist())
+        ]
+
+
+@lru_cache(maxsize=None)
+def batched_engine() -> BatchedThai2Rom | None:
+    """Build the batched engine once per process, or None if this pythainlp release lacks the expected internals."""
+    try:
+        return BatchedThai2Rom(
+            int(os.environ.get(BATCH_SIZE_ENV, BATCH_SIZE)),
+            int(os.environ.get(THREADS_ENV, 0)),
+        )
+    except (ImportError, AttributeError, KeyError) as e:
+        print(f"Batched Thai romanization unavailable, romanizing token by token: {e}", file=sys.stderr)
+        return None
+
+
+def romanize_tokens(tokens: set[str]) -> dict[str, str]:
+    """Romanize distinct Thai tokens with the engine, batched when possible."""
+    engine = batched_engine() if tokens else None
+    if engine is None:
+        return {token: romanize(token, engine=ENGINE) for token in tokens}
+    return engine.romanize_many(tokens)
+
+
+@lru_cache(maxsize=None)
+def token_cache() -> TokenCache | None:
+    """Open the cache named by THAI_ROMANIZATION_CACHE once per process, or None if it is not set."""
+    path = os.environ.get(CACHE_ENV)
+    if not path:
+        return None
+    max_entries = int(os.environ.get(CACHE_MAX_ENTRIES_ENV, CACHE_MAX_ENTRIES))
+    try:
+        return TokenCache(path, engine_version(), max_entries)
+    except sqlite3.Error as e:
+        # The cache only saves work; romanize without it rather than fail
+        print(f"Thai token cache disabled: {e}", file=sys.stderr)
+        return None
 
 
 def romanize_thai_tokens(s: str) -> str:
-    separator = "\U000f0000\U000f0001"
-    parts = s.split(separator)
-    out = []
+    return romanize_batch([s])[0]
 
-    for part in parts:
-        if THAI_ONLY.match(part):
-            out.append(romanize(part, engine="thai2rom_onnx"))
-        else:
-            out.append(part)
 
-    translit = " ".join(out)
+def romanize_batch(strings: list[str], romanize_unknown=romanize_tokens) -> list[str]:
+    """Romanize many segmented strings, running the engine once per distinct Thai token not in the table or cache."""
+    split = [s.split(SEPARATOR) for s in strings]
+    tokens = {part for parts in split for part in parts if THAI_ONLY.match(part)}
+
+    table = romanization_table() if tokens else {}
+    romanized = {token: table[token] for token in tokens if token in table}
+    unknown = tokens - romanized.keys()
+
+    cache = token_cache()
+    cached = {}
+    if cache and unknown:
+        try:
+            cached = cache.get_many(unknown)
+        except sqlite3.Error as e:
+            print(f"Thai token cache lookup failed: {e}", file=sys.stderr)
+
+    new = romanize_unknown(unknown - cached.keys())
+    if cache and unknown:
+        try:
+            cache.put_many(new, set(cached))
+        except sqlite3.Error as e:
+            print(f"Thai token cache update failed: {e}", file=sys.stderr)
+
+    romanized.update(cached)
+    romanized.update(new)
+    return [join_romanized([romanized.get(part, part) for part in parts]) for parts in split]
+
+
+def join_romanized(parts: list[str]) -> str:
+    """Join romanized tokens and apply the spacing and punctuation cleanup."""
+    translit = " ".join(parts)
 
     translit = re.sub(r"\s*/\s*", "/", translit)
     translit = re.sub(
@@ -32,4 +398,97 @@ def romanize_thai_tokens(s: str) -> str:
     return translit
 
 
-print(romanize_thai_tokens(text))
+def romanize_document(text: str, workers: int) -> str:
+    """Romanize one long segmented text, romanizing its distinct tokens in a process pool."""
+    return romanize_batch([text], lambda tokens: romanize_in_pool(tokens, workers))[0]
+
+
+def romanize_in_pool(tokens: set[str], workers: int) -> dict[str, str]:
+    if workers <= 1 or len(tokens) < PARALLEL_MIN_TOKENS:
+        return romanize_tokens(tokens)
+
+    # Dealing tokens out in length order gives every worker a similar mix of lengths,
+    # so its equal-length batches stay full
+    ordered = sorted(tokens, key=len)
+    chunks = [ordered[i::workers] for i in range(workers)]
+
+    romanized = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker) as pool:
+        for chunk_romanized in pool.map(romanize_chunk, chunks):
+            romanized.update(chunk_romanized)
+    return romanized
+
+
+def _init_pool_worker() -> None:
+    # Parallelism comes from the processes; one ONNX thread each avoids oversubscribing the cores
+    os.environ.setdefault(THREADS_ENV, "1")
+
+
+def romanize_chunk(tokens: list[str]) -> dict[str, str]:
+    return romanize_tokens(set(tokens))
+
+
+def handle_request(line: str) -> dict:
+    """Answer one JSON-lines request; failures become an error reply instead of ending the worker."""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get("id")
+        if "texts" in request:
+            return {"id": request_id, "results": romanize_batch(request["texts"])}
+        return {"id": request_id, "result": romanize_thai_tokens(request["text"])}
+    except Exception as e:
+        return {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout) -> None:
+    """Answer requests until stdin closes, flushing each reply so the caller never waits on a buffer."""
+    # Pipes default to the locale encoding on some platforms; requests are always UTF-8
+    for stream in (stdin, stdout):
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(encoding="utf-8")
+    # Load the ONNX engine before the first request instead of during it
+    romanize_tokens({"ก"})
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        stdout.write(json.dumps(handle_request(line), ensure_ascii=False) + "\n")
+        stdout.flush()
+
+
+def main() -> None:
+    # Lets the PyInstaller binary start pool workers
+    multiprocessing.freeze_support()
+
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+    elif sys.argv[1:] == ["--batch"]:
+        sys.stdin.reconfigure(encoding="utf-8")
+        print(json.dumps(romanize_batch(json.load(sys.stdin)), ensure_ascii=False))
+    elif sys.argv[1:] == ["--cache-stats"]:
+        cache = token_cache()
+        if cache is None:
+            sys.exit(f"{CACHE_ENV} is not set")
+        print(json.dumps(cache.stats()))
+    elif sys.argv[1:2] == ["--document"] and len(sys.argv) <= 3:
+        if len(sys.argv) == 3:
+            with open(sys.argv[2], encoding="utf-8") as f:
+                text = f.read()
+        else:
+            sys.stdin.reconfigure(encoding="utf-8")
+            text = sys.stdin.read()
+        workers = int(os.environ.get(WORKERS_ENV, os.cpu_count() or 1))
+        # A trailing newline from the file or pipe would otherwise stick to the last token
+        print(romanize_document(text.rstrip("\r\n"), workers))
+    elif len(sys.argv) == 2:
+        print(romanize_thai_tokens(sys.argv[1]))
+    else:
+        sys.exit(
+            "Usage: python-thai-romanization.py <segmented string> | --batch | --serve | --cache-stats"
+            " | --document [path]"
+        )
+
+
+if __name__ == "__main__":
+    main()
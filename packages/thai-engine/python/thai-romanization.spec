@@ -5,7 +5,7 @@ a = Analysis(
     ['python-thai-romanization.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('thai-romanization-table.json.gz', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},